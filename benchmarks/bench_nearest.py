@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+'''
+Scaling benchmark for nearest() - the AGP divider to TPF component end search.
+
+Builds a synthetic fragmented TPF (many small components per scaffold, a break near
+every few components), then times the original per-divider linear scan against the
+sorted index lookup now used by rapid_pretext2tpf.nearest().  Both must return the
+same closest map.  The banded alignment used by --fit align (align_ends) is timed alongside.
+
+	python benchmarks/bench_nearest.py --sizes 10000 50000 100000 200000
+'''
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","original"))
+import rapid_pretext2tpf as rp
+
+
+#Synthetic tpf table/tpfdict in parse_tpf format, the same tpf as text lines for the baseline, plus agp dividers jittered around real component ends
+def synthetic(components,percomp,breakevery,jitter,seed):
+
+	rng=random.Random(seed)
+	table=rp.tpf_table()
+	tpfdict={}
+	tpflines={}
+	dividers={}
+	scaffs=max(1,components//percomp)
+	for s in range(1,scaffs+1):
+		scaff="scaffold_"+str(s)
+		lines=[]
+		pos=1
+		for c in range(percomp):
+			hi=pos+rng.randint(2000,60000)
+			if c>0:
+				lines.append("GAP\tTYPE-2\t200\n")
+				rp.append_dict(scaff,rp.add_row(table,"",0,0,0,"GAP\tTYPE-2\t200",1),tpfdict)
+			lines.append("?\t"+scaff+":"+str(pos)+"-"+str(hi)+"\t"+scaff+"\tPLUS\n")
+			rp.append_dict(scaff,rp.add_row(table,scaff,pos,hi,1,scaff,0),tpfdict)
+			if c%breakevery==breakevery-1:
+				rp.append_dict(scaff,hi+rng.randint(-jitter,jitter),dividers)
+			pos=hi+201
+		tpflines[scaff]=lines
+	for k,v in dividers.items():
+		dividers[k]=sorted(v)
+	return table,tpfdict,tpflines,dividers
+
+
+#The original nearest() search loop, kept here as the baseline to measure against
+def scan_closest(tpflines,dividers,fragsize):
+
+	closest={}
+	for k,v in dividers.items():
+		for div in v:
+			for line in tpflines[k]:
+				if not "GAP" in line:
+					tmax=int(line.split()[1].split("-")[1])
+					pre=k+":"+str(div)
+					if abs(tmax-div) < rp.netsize*fragsize:
+						if pre not in closest:
+							closest[pre]=tmax
+						elif abs(tmax-div)<abs(tmax-closest[pre]):
+							closest[pre]=tmax
+	return closest
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description='Time nearest() against the original linear scan on synthetic TPFs.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[10000,50000,100000,200000], help='component counts to test')
+	parser.add_argument('--percomp', type=int, default=2000, help='components per scaffold')
+	parser.add_argument('--breakevery', type=int, default=5, help='one agp divider every N components')
+	parser.add_argument('--texel', type=int, default=12000, help='texel size (bp) used as fragsize')
+	parser.add_argument('--scan-limit', type=int, default=100000, help='skip the quadratic baseline above this many components')
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	print("components\tdividers\tindex_s\tsearch_s\talign_s\tscan_s\tspeedup")
+	for n in args.sizes:
+		table,tpfdict,tpflines,dividers=synthetic(n,args.percomp,args.breakevery,args.texel,args.seed)
+		ndivs=sum(len(v) for v in dividers.values())
+
+		t0=time.perf_counter()
+		index=rp.tpf_index(table,tpfdict)
+		t1=time.perf_counter()
+		rp.closest_ends(index,dividers,args.texel)
+		t2=time.perf_counter()
+		rp.align_ends(index,dividers,args.texel)
+		align=round(time.perf_counter()-t2,3)
+
+		if n<=args.scan_limit:
+			t3=time.perf_counter()
+			scanned=scan_closest(tpflines,dividers,args.texel)
+			t4=time.perf_counter()
+			indexed=rp.closest_ends(index,dividers,args.texel)
+			if indexed!=scanned:
+				sys.exit("closest map differs from the linear scan at "+str(n)+" components")
+			scan=round(t4-t3,3)
+			speedup=str(round((t4-t3)/max(t2-t1,1e-9),1))+"x"
+		else:
+			scan="-"
+			speedup="-"
+		print("\t".join(str(i) for i in [n,ndivs,round(t1-t0,3),round(t2-t1,3),align,scan,speedup]))
+
+
+if __name__ == '__main__':
+	main()
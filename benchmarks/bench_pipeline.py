@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+'''
+Scaling benchmark for the whole rapid_pretext2tpf run, stage by stage.
+
+For each size a synthetic TPF and curated AGP are generated (see synth_curation.py) and
+rapid_pretext2tpf.py is run on them in a fresh process with --profile, which records the
+wall time, peak RSS and item counts of every stage of main().  Stages whose time grows
+faster than the input (exponent over --warn between consecutive sizes) are flagged - these
+are the ones that will hurt on a 10 Gb genome.
+
+	python benchmarks/bench_pipeline.py --sizes 10000 20000 40000 --json bench.json
+'''
+
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+import subprocess
+
+import synth_curation
+
+SCRIPT=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","original","rapid_pretext2tpf.py")
+
+
+#Sums repeated runs of the same stage, keeping the highest peak RSS seen
+def per_stage(records):
+
+	stages={}
+	for r in records:
+		if r["stage"] not in stages:
+			stages[r["stage"]]=[0.0,0]
+		stages[r["stage"]][0]+=r["wall_s"]
+		stages[r["stage"]][1]=max(stages[r["stage"]][1],r["peak_rss_mb"] or 0)
+	return stages
+
+
+def bench_size(n,args,workdir):
+
+	outdir=os.path.join(workdir,str(n))
+	tpf,agp=synth_curation.generate(outdir,n,max(1,n//args.percomp),int(n*args.breaks),int(n*args.joins),int(n*args.inversions),args.haplotigs,args.unlocs,args.sex,seed=args.seed)
+	out=os.path.join(outdir,"profile.json")
+	with open(os.devnull,'w') as null:
+		subprocess.run([sys.executable,os.path.abspath(SCRIPT),tpf,agp,"--profile",out],cwd=outdir,stdout=null,check=True)
+	with open(out) as f:
+		result=json.load(f)
+	result["components"]=n
+	last=result["stages"][-1]["stage"] if result["stages"] else "start"
+	result["status"]="ok" if last=="tpf_sanity" else "stopped after "+last
+	result["stages"]=per_stage(result["stages"])
+	return result
+
+
+def report(results,warn):
+
+	names=[]
+	for r in results:
+		for name in r["stages"]:
+			if name not in names:
+				names.append(name)
+	sizes=[r["components"] for r in results]
+	print("stage\t"+"\t".join(str(n)+"_s" for n in sizes)+"\texponent")
+	for name in names:
+		secs=[r["stages"].get(name,[0.0,0])[0] for r in results]
+		exps=[]
+		for i in range(1,len(results)):
+			if secs[i-1]>=0.01 and secs[i]>0:	#too fast to time reliably below 10ms
+				exps.append(math.log(secs[i]/secs[i-1])/math.log(sizes[i]/sizes[i-1]))
+		exp=round(max(exps),2) if exps else "-"
+		flag="\t<<<" if exps and max(exps)>warn else ""
+		print(name+"\t"+"\t".join(str(round(s,3)) for s in secs)+"\t"+str(exp)+flag)
+	print("TOTAL\t"+"\t".join(str(round(r["wall_s"],3)) for r in results))
+	print("peak_rss_mb\t"+"\t".join(str(r["peak_rss_mb"]) for r in results))
+	print("status\t"+"\t".join(r["status"] for r in results))
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description='Time each stage of rapid_pretext2tpf.main() on synthetic curations of increasing size.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[5000,10000,20000,40000], help='component counts to test')
+	parser.add_argument('--percomp', type=int, default=50, help='components per source scaffold')
+	parser.add_argument('--breaks', type=float, default=0.01, help='breaks per component')
+	parser.add_argument('--joins', type=float, default=0.01, help='joins per component')
+	parser.add_argument('--inversions', type=float, default=0.005, help='inversions per component')
+	parser.add_argument('--haplotigs', type=int, default=5, help='haplotig tagged pieces')
+	parser.add_argument('--unlocs', type=int, default=5, help='unloc tagged pieces')
+	parser.add_argument('--sex', type=str, default="XY", help='sex chromosome pair to tag')
+	parser.add_argument('--warn', type=float, default=1.5, help='flag stages whose time grows faster than size to this power')
+	parser.add_argument('--json', type=str, help='also write the results here')
+	parser.add_argument('--workdir', type=str, help='keep the generated inputs and outputs here (default: a temporary directory)')
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		workdir=args.workdir or tmp
+		results=[bench_size(n,args,workdir) for n in sorted(args.sizes)]
+	report(results,args.warn)
+	if args.json:
+		with open(args.json,'w') as fout:
+			json.dump(results,fout,indent=1)
+
+
+if __name__ == '__main__':
+	main()
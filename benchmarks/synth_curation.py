@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+'''
+Synthetic assembly TPF plus a matching PretextView style AGP, at any scale.
+
+The TPF is a set of source scaffolds made of components separated by 200bp gaps.  The AGP
+is what a curator would paint from it: some scaffolds broken at (texel jittered) gaps,
+pieces joined into chromosomes, some pieces inverted, and haplotig, unloc and sex
+chromosome tags in the places rapid_pretext2tpf accepts them (haplotigs and unlocs at
+chromosome ends, one sex pair, no haplotigs on the sex chromosomes).
+
+	python benchmarks/synth_curation.py outdir --components 100000 --scaffolds 2000 --breaks 1000 --joins 1500
+'''
+
+import os
+import random
+import argparse
+
+GAP="GAP\tTYPE-2\t200\n"
+AGPGAP="\tU\t100\tscaffold\tyes\tproximity_ligation\n"
+
+
+#Component counts per scaffold - every scaffold gets one, the rest go preferentially to the first (chromosome sized) scaffolds
+def spread(components,scaffolds,rng):
+
+	counts=[1]*scaffolds
+	weights=[1/(i+1) for i in range(scaffolds)]
+	for s in rng.choices(range(scaffolds),weights,k=components-scaffolds):
+		counts[s]+=1
+	return counts
+
+
+#Source scaffolds as {scaff: [(lo,hi), ...]} components, in order
+def make_tpf(components,scaffolds,minlen,maxlen,rng):
+
+	tpf={}
+	for s,n in enumerate(spread(components,scaffolds,rng)):
+		comps=[]
+		pos=1
+		for c in range(n):
+			hi=pos+rng.randint(minlen,maxlen)-1
+			comps.append((pos,hi))
+			pos=hi+201
+		tpf["scaffold_"+str(s+1)]=comps
+	return tpf
+
+
+#Cuts scaffolds into AGP pieces [scaff,lo,hi,orientation,tags] at randomly chosen gaps, the divider jittered by up to a texel as a PretextView edit would be
+def make_pieces(tpf,breaks,texel,rng):
+
+	gaps=[(s,i) for s,comps in tpf.items() for i in range(len(comps)-1)]
+	cuts={}
+	for s,i in rng.sample(gaps,min(breaks,len(gaps))):
+		cuts.setdefault(s,[]).append(i)
+	pieces=[]
+	for s,comps in tpf.items():
+		lo=1
+		for i in sorted(cuts.get(s,[])):
+			clo,chi=comps[i]
+			nlo=comps[i+1][0]
+			div=max(clo,min(nlo-1,chi+rng.randint(-texel,texel)))
+			if div>lo:
+				pieces.append([s,lo,div,"+",[]])
+				lo=div+1
+		pieces.append([s,lo,comps[-1][1],"+",[]])
+	return pieces
+
+
+#Joins pieces into superscaffolds, inverts some, then tags haplotigs, unlocs and the sex chromosomes
+def make_agp(pieces,joins,inversions,haplotigs,unlocs,sex,rng):
+
+	for p in rng.sample(pieces,min(inversions,len(pieces))):
+		p[3]="-"
+	order=list(pieces)
+	rng.shuffle(order)
+	spare=max(0,len(order)-joins-haplotigs-unlocs)
+	chrms=[[p] for p in order[:max(1,min(spare,len(order)//4 or 1))]]
+	rest=order[len(chrms):]
+	joined,rest=rest[:joins],rest[joins:]
+	for p in joined:
+		rng.choice(chrms).append(p)
+	tagged,rest=rest[:haplotigs+unlocs],rest[haplotigs+unlocs:]
+
+	sexchrms=[]
+	if sex and len(chrms)>2:
+		sexchrms=chrms[-2:]
+		for tag,chrm in zip(sex,sexchrms):
+			for p in chrm:
+				p[4].append(tag)
+	autosomes=chrms[:len(chrms)-len(sexchrms)]
+	for i,p in enumerate(tagged):
+		if i<haplotigs:
+			p[4].append("Haplotig")
+			rng.choice(autosomes or chrms).append(p)
+		else:
+			p[4].append("Unloc")
+			rng.choice(chrms).append(p)
+	for chrm in chrms:
+		for p in chrm:
+			p[4].insert(0,"Painted")
+	return chrms+[[p] for p in rest]
+
+
+def write_tpf(tpf,path):
+
+	with open(path,'w') as fout:
+		for s,comps in tpf.items():
+			for i,(lo,hi) in enumerate(comps):
+				if i>0:
+					fout.write(GAP)
+				fout.write("?\t"+s+":"+str(lo)+"-"+str(hi)+"\t"+s+"\tPLUS\n")
+
+
+def write_agp(superscaffs,resolution,path):
+
+	with open(path,'w') as fout:
+		fout.write("##agp-version\t2.1\n")
+		fout.write("# DESCRIPTION: Generated by synth_curation.py\n")
+		fout.write("# HiC MAP RESOLUTION: "+str(round(resolution,6))+" bp/texel\n")
+		for n,pieces in enumerate(superscaffs):
+			name="Scaffold_"+str(n+1)
+			pos=1
+			part=1
+			for i,(s,lo,hi,orient,tags) in enumerate(pieces):
+				if i>0:
+					fout.write(name+"\t"+str(pos)+"\t"+str(pos+99)+"\t"+str(part)+AGPGAP)
+					pos+=100
+					part+=1
+				end=pos+hi-lo
+				fout.write("\t".join([name,str(pos),str(end),str(part),"W",s,str(lo),str(hi),orient]+tags)+"\n")
+				pos=end+1
+				part+=1
+
+
+#Writes outdir/synth.tpf and outdir/synth.pretext.agp, returns their paths
+def generate(outdir,components,scaffolds,breaks,joins,inversions=0,haplotigs=0,unlocs=0,sex="",minlen=2000,maxlen=200000,seed=1):
+
+	rng=random.Random(seed)
+	scaffolds=max(1,min(scaffolds,components))
+	tpf=make_tpf(components,scaffolds,minlen,maxlen,rng)
+	total=sum(hi-lo+1 for comps in tpf.values() for lo,hi in comps)
+	resolution=total/32768
+	pieces=make_pieces(tpf,breaks,int(round(resolution)),rng)
+	superscaffs=make_agp(pieces,joins,inversions,haplotigs,unlocs,sex,rng)
+	os.makedirs(outdir,exist_ok=True)
+	tpfpath=os.path.join(outdir,"synth.tpf")
+	agppath=os.path.join(outdir,"synth.pretext.agp")
+	write_tpf(tpf,tpfpath)
+	write_agp(superscaffs,resolution,agppath)
+	return tpfpath,agppath
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description='Write a synthetic TPF and a curated PretextView style AGP for it.')
+	parser.add_argument('outdir', type=str, help='directory for synth.tpf and synth.pretext.agp')
+	parser.add_argument('--components', type=int, default=10000, help='components in the TPF')
+	parser.add_argument('--scaffolds', type=int, default=200, help='source scaffolds in the TPF')
+	parser.add_argument('--breaks', type=int, default=100, help='scaffolds breaks painted in the AGP')
+	parser.add_argument('--joins', type=int, default=150, help='pieces joined onto chromosomes')
+	parser.add_argument('--inversions', type=int, default=50, help='pieces inverted')
+	parser.add_argument('--haplotigs', type=int, default=5, help='pieces tagged Haplotig')
+	parser.add_argument('--unlocs', type=int, default=5, help='pieces tagged Unloc')
+	parser.add_argument('--sex', type=str, default="XY", help='sex chromosome pair to tag (XY, ZW or "" for none)')
+	parser.add_argument('--minlen', type=int, default=2000, help='shortest component (bp)')
+	parser.add_argument('--maxlen', type=int, default=200000, help='longest component (bp)')
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	for path in generate(args.outdir,args.components,args.scaffolds,args.breaks,args.joins,args.inversions,args.haplotigs,args.unlocs,args.sex,args.minlen,args.maxlen,args.seed):
+		print(path)
+
+
+if __name__ == '__main__':
+	main()
@@ -1,30 +1,25 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-import gzip
-from Bio import SeqIO
-from binascii import hexlify
+from faidx import fai_lengths
+from zopen import Open
+
+USAGE = "Usage: AGPCorrect ref.fa(.gz) scaffs.agp(.gz) [threads] >corrected_scaffs.agp"
 
 if len(sys.argv) == 1 or (sys.argv[1] in ("-h", "--help")):
-    print(
-        "Usage: AGPCorrect ref.fa(.gz) scaffs.agp >corrected_scaffs.agp",
-        file=sys.stderr,
-    )
+    print(USAGE, file=sys.stderr)
     sys.exit(0)
 
-if len(sys.argv) != 3:
-    sys.exit("Usage: AGPCorrect ref.fa(.gz) scaffs.agp >corrected_scaffs.agp")
-
+if len(sys.argv) not in (3, 4):
+    sys.exit(USAGE)
 
-def Open(file_name):
-    with open(file_name, "rb") as f:
-        isgzip = hexlify(f.read(2)) == b"1f8b"
-    return gzip.open(file_name, "rt") if isgzip else open(file_name, "r")
+# Threads for inflating a bgzipped fasta, plain gzip is always read on one
+threads = int(sys.argv[3]) if len(sys.argv) == 4 else min(4, os.cpu_count() or 1)
 
 
 print("Reading fasta...", file=sys.stderr)
-with Open(sys.argv[1]) as f:
-    seqs = {seq.id: len(seq) for seq in SeqIO.parse(f, "fasta")}
+seqs = fai_lengths(sys.argv[1], threads)  # uses/saves ref.fa.fai, never loads a sequence
 print(
     f"Read fasta, {len(seqs)} sequences",
     *(f"{s}: {n} bp" for s, n in seqs.items()),
@@ -33,62 +28,66 @@ print(
     sep="\n",
 )
 
+# One read of the agp. The last piece of a component (the one reaching its
+# furthest end) is only known once every piece has been seen, so the lines are
+# kept for the rewrite below rather than reading the file a second time.
+agp = []
 seen = {}
-with open(sys.argv[2], "r") as f:
+with Open(sys.argv[2]) as f:
     for line in f:
+        line = line[:-1]
+        agp.append(line)
         if not line.startswith("#"):
             line = line.split("\t")
             if line[4] == "W":
-                seen[line[5]] = max(seen.setdefault(line[5], 0), int(line[7]))
+                seen[line[5]] = max(seen.get(line[5], 0), int(line[7]))
 
-with open(sys.argv[2], "r") as f:
-    curr_scaff = None
-    maxn = 1
-    for line in f:
-        line = line[:-1]
-        if not line.startswith("#"):
-            line = line.split("\t")
+curr_scaff = None
+maxn = 1
+for line in agp:
+    if not line.startswith("#"):
+        line = line.split("\t")
 
-            if curr_scaff != line[0]:
-                if curr_scaff:
-                    print(f"{curr_scaff}: {correct} bp correction", file=sys.stderr)
+        if curr_scaff != line[0]:
+            if curr_scaff:
+                print(f"{curr_scaff}: {correct} bp correction", file=sys.stderr)
 
-                curr_scaff = line[0]
-                correct = 0
+            curr_scaff = line[0]
+            correct = 0
 
-            line[1] = str(int(line[1]) + correct)
+        line[1] = str(int(line[1]) + correct)
 
-            if line[4] == "W" and ((this_l := int(line[7])) == seen[line[5]]):
-                correct += (acc_l := seqs[line[5]]) - this_l
+        if line[4] == "W" and ((this_l := int(line[7])) == seen[line[5]]):
+            correct += (acc_l := seqs[line[5]]) - this_l
 
-                if int(line[6]) >= acc_l:
-                    sys.exit(
-                        "Error with line: {}\n{} > {}".format(
-                            "\t".join(line), line[6], acc_l
-                        )
+            if int(line[6]) >= acc_l:
+                sys.exit(
+                    "Error with line: {}\n{} > {}".format(
+                        "\t".join(line), line[6], acc_l
                     )
+                )
 
-                line[7] = str(acc_l)
+            line[7] = str(acc_l)
 
-            line[2] = str(int(line[2]) + correct)
+        line[2] = str(int(line[2]) + correct)
 
-            print("\t".join(line))
-            maxn = max(maxn, int(line[0].split("_")[-1]))
-        else:
-            if line.startswith("# DESCRIPTION"):
-                line += "\tModified by PretextView_AGPCorrect"
-            print(line)
+        print("\t".join(line))
+        maxn = max(maxn, int(line[0].split("_")[-1]))
+    else:
+        if line.startswith("# DESCRIPTION"):
+            line += "\tModified by PretextView_AGPCorrect"
+        print(line)
 
-    if curr_scaff:
-        print(f"{curr_scaff}: {correct} bp correction", file=sys.stderr)
+if curr_scaff:
+    print(f"{curr_scaff}: {correct} bp correction", file=sys.stderr)
+del agp
 
 maxn += 1
+unplaced = [(s, n) for s, n in seqs.items() if s not in seen]
 print(
     *(
         "\t".join((f"Scaffold_{maxn + k}", "1", str(n), "1", "W", s, "1", str(n), "+"))
-        for k, (s, n) in enumerate(
-            (s, n) for s, n in seqs.items() if s not in set(seen.keys())
-        )
+        for k, (s, n) in enumerate(unplaced)
     ),
     sep="\n",
 )
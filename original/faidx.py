@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Sequence lengths from a samtools style .fai index.
+
+fai_lengths() reads ref.fa.fai when it is present and no older than the
+FASTA. Otherwise it builds the index with a streaming byte scan that never
+holds a sequence in memory, and saves it next to the FASTA for the next
+run. A .fai is not saved for plain gzip FASTA, since samtools can only
+index those once they are bgzipped.
+"""
+
+import os
+import sys
+from zopen import Open, GZIP_MAGIC, atomic_write, is_bgzf
+
+CHUNK = 1 << 22
+
+
+def scan_fai(fasta, threads=1):
+    """Build .fai rows (name, length, offset, linebases, linewidth) in one pass.
+
+    The FASTA is read in 4 Mb chunks and bases are counted with bytes.count,
+    so no line or sequence is ever materialised. Offsets are in uncompressed
+    bytes, as samtools writes them for BGZF.
+    """
+    rows = []
+    rec = None
+    header = b""
+    in_header = False
+    line_start = True
+    first_bases = first_bytes = 0  # first sequence line of rec, until its newline
+    base = 0
+    with Open(fasta, threads, binary=True) as f:
+        while True:
+            buf = f.read(CHUNK)
+            if not buf:
+                break
+            i = 0
+            while i < len(buf):
+                if in_header:
+                    k = buf.find(b"\n", i)
+                    if k < 0:
+                        header += buf[i:]
+                        break
+                    header += buf[i:k]
+                    rec = [header.split()[0].decode(), 0, base + k + 1, None, None]
+                    rows.append(rec)
+                    first_bases = first_bytes = 0
+                    in_header = False
+                    line_start = True
+                    i = k + 1
+                    continue
+                if line_start and buf[i] == 62:  # ">"
+                    header = b""
+                    in_header = True
+                    i += 1
+                    continue
+                k = buf.find(b"\n>", i)
+                j = len(buf) if k < 0 else k + 1
+                if rec is not None:
+                    rec[1] += j - i - buf.count(b"\n", i, j) - buf.count(b"\r", i, j)
+                    if rec[3] is None:
+                        e = buf.find(b"\n", i, j)
+                        stop = j if e < 0 else e + 1
+                        first_bytes += stop - i
+                        first_bases += stop - i - buf.count(b"\n", i, stop) - buf.count(b"\r", i, stop)
+                        if e >= 0:
+                            rec[3], rec[4] = first_bases, first_bytes
+                line_start = buf[j - 1] == 10  # "\n"
+                i = j
+            base += len(buf)
+    for rec in rows:
+        if rec[3] is None:  # empty sequence, or a last line without a trailing newline
+            rec[3], rec[4] = (first_bases, first_bytes) if rec is rows[-1] else (0, 0)
+    return rows
+
+
+def read_fai(fai):
+    """{name: length} from an existing .fai."""
+    with open(fai) as f:
+        return {
+            x[0]: int(x[1]) for x in (line.split("\t") for line in f) if len(x) > 1
+        }
+
+
+def write_fai(rows, fai):
+    """Write the index beside the FASTA, via a temporary file so readers never see half of it."""
+    with atomic_write(fai) as f:
+        for name, length, offset, linebases, linewidth in rows:
+            f.write(f"{name}\t{length}\t{offset}\t{linebases}\t{linewidth}\n")
+
+
+def fai_lengths(fasta, threads=1):
+    """{name: length} for every sequence in fasta, in file order."""
+    fai = fasta + ".fai"
+    if os.path.exists(fai) and os.path.getmtime(fai) >= os.path.getmtime(fasta):
+        return read_fai(fai)
+
+    rows = scan_fai(fasta, threads)
+    with open(fasta, "rb") as f:
+        head = f.read(18)
+    if head[:2] != GZIP_MAGIC or is_bgzf(head):
+        try:
+            write_fai(rows, fai)
+        except OSError as e:
+            print(f"Could not save {fai}: {e}", file=sys.stderr)
+    return {name: length for name, length, *_ in rows}
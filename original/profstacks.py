@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+cProfile capture for a whole run, written as a pstats dump plus collapsed stacks.
+
+cProfile only keeps caller -> callee edges, not full stacks, and rebuilding
+stacks from those edges invents paths that never ran (every stage goes
+through the same staged() wrapper). So the collapsed stacks come from a
+sampler thread instead, which reads the main thread's whole frame chain
+every INTERVAL seconds and credits the stack it finds with the time since
+the previous sample. Only Python frames are seen, so time in a builtin is
+counted to the Python function that called it. The result loads in
+flamegraph.pl, speedscope or inferno as usual.
+"""
+
+import os
+import sys
+import time
+import cProfile
+import pstats
+import threading
+
+INTERVAL = 0.001  # seconds between samples
+
+
+def frame(code):
+    """flamegraph frame name for a code object, named as pstats names functions."""
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+class Sampler(threading.Thread):
+    """Collects {"root;...;leaf": microseconds} stacks of one thread until stop()."""
+
+    def __init__(self, thread_id):
+        super().__init__(name="profstacks", daemon=True)
+        self.thread_id = thread_id
+        self.stacks = {}
+        self.done = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.done.wait(INTERVAL):
+            f = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            path = []
+            while f is not None:
+                path.append(frame(f.f_code))
+                f = f.f_back
+            if path:
+                key = ";".join(reversed(path))
+                self.stacks[key] = self.stacks.get(key, 0) + int((now - last) * 1e6)
+            last = now
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return self.stacks
+
+
+def start():
+    """Start profiling and sampling the calling thread for the rest of the run; hand the result to finish()."""
+    sampler = Sampler(threading.get_ident())
+    sampler.start()
+    prof = cProfile.Profile()
+    prof.enable()
+    return prof, sampler
+
+
+def finish(trace, prefix):
+    """Stop a start() trace and write prefix.pstats and prefix.collapsed, returning their paths."""
+    prof, sampler = trace
+    prof.disable()
+    stacks = sampler.stop()
+    pstats.Stats(prof).dump_stats(prefix + ".pstats")
+    with open(prefix + ".collapsed", "w") as fout:
+        for key, us in sorted(stacks.items()):
+            if us:
+                fout.write(f"{key} {us}\n")
+    return prefix + ".pstats", prefix + ".collapsed"
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+Library API for rapid_pretext2tpf: fit a TPF to a PretextView AGP in process.
+
+A workflow engine can load a TPF once and curate many AGPs against it without
+starting a process, writing files or catching sys.exit per run. Input errors
+that make the command line stop (AGP components missing from the TPF,
+coordinate typos, bad tags) come back as Result.errors instead, with the
+report the script would have printed in Result.report.
+
+    import rapid_api
+    tpf = rapid_api.load_tpf("assembly.tpf")
+    result = rapid_api.curate(tpf, rapid_api.read_agp("curated.pretext.agp"))
+    if result.ok:
+        rapid_api.write_result(result, outdir="out")
+
+The script keeps its settings in module globals, which curate() sets from
+Params for the length of a call, so calls must not overlap across threads;
+run parallel curations in separate processes.
+"""
+
+import io
+import os
+import contextlib
+import dataclasses
+from dataclasses import dataclass, field
+
+import rapid_pretext2tpf as rp
+
+
+@dataclass
+class Params:
+    """Fitting settings, as the rapid_pretext2tpf globals of the same names."""
+
+    netsize: float = rp.netsize
+    lowcutoff: float = rp.lowcutoff
+    prefix: str = rp.prefix
+    sex: tuple = tuple(rp.sex)
+    fitting: str = rp.fitting
+    adaptive: bool = rp.adaptive
+
+
+@dataclass
+class Result:
+    """What one curation produced.
+
+    dividers maps "scaffold:agp coordinate" to the TPF coordinate broken at,
+    tpf and haps map each output scaffold to its TPF lines, sanity holds the
+    output TPF's problems ({check: [(line, scaffold, message)]}). errors is
+    set, and the outputs empty, when the run stopped on an input error.
+    """
+
+    ok: bool
+    errors: dict = field(default_factory=dict)
+    report: str = ""
+    dividers: dict = field(default_factory=dict)
+    tpf: dict = field(default_factory=dict)
+    haps: dict = field(default_factory=dict)
+    sanity: dict = field(default_factory=dict)
+    joins: int = 0
+    maps: dict = field(default_factory=dict, repr=False)
+
+    def tpf_lines(self):
+        return [line for v in self.tpf.values() for line in v]
+
+    def haps_lines(self):
+        return [line for v in self.haps.values() for line in v]
+
+    def coord_map(self, scaffold):
+        """Prefix sum map of an output scaffold (from tpf or haps), built on first use."""
+        if scaffold not in self.maps:
+            lines = self.tpf[scaffold] if scaffold in self.tpf else self.haps[scaffold]
+            self.maps[scaffold] = rp.layout_map(lines)
+        return self.maps[scaffold]
+
+    def to_source(self, scaffold, positions):
+        """(source scaffold, bp) behind each 1 based position of an output scaffold, None in gaps."""
+        return [
+            None if hit is None else hit[1:]
+            for hit in rp.map_to_source(self.coord_map(scaffold), positions)
+        ]
+
+    def from_source(self, scaffold, queries):
+        """Position in an output scaffold of each (source scaffold, bp), None where it isn't placed there."""
+        return rp.map_from_source(self.coord_map(scaffold), queries)
+
+
+def new_caches():
+    """Empty per scaffold caches; pass the same dict to curate() for every edit of one AGP."""
+    return {"nearest": {}, "breaktpf": {}, "outputlist": {}}
+
+
+def _check_caches(caches, tpfdata, params):
+    # Cached results only hold for the tpf and settings they were built with
+    built = caches.get("built")
+    if built is None or built[0] is not tpfdata or built[1] != params:
+        for k in ("nearest", "breaktpf", "outputlist"):
+            caches[k].clear()
+        caches["built"] = (tpfdata, dataclasses.replace(params))
+
+
+@contextlib.contextmanager
+def _settings(params):
+    saved = (rp.netsize, rp.lowcutoff, rp.prefix, rp.sex, rp.fitting, rp.adaptive)
+    rp.netsize, rp.lowcutoff, rp.prefix = params.netsize, params.lowcutoff, params.prefix
+    rp.sex = list(params.sex)
+    rp.fitting, rp.adaptive = params.fitting, params.adaptive
+    try:
+        yield
+    finally:
+        rp.netsize, rp.lowcutoff, rp.prefix, rp.sex, rp.fitting, rp.adaptive = saved
+
+
+def load_tpf(tpf, name=None):
+    """Parse and index a TPF (a path or its lines) for any number of curate() calls.
+
+    name is used for the TPF in reports, the path by default. Problems the
+    sanity checks find are printed, as the command line does.
+    """
+    if not isinstance(tpf, (str, bytes, os.PathLike)):
+        tpf = list(tpf)
+        name = "tpf" if name is None else name
+    return rp.load_tpf(tpf, name)
+
+
+def read_agp(agp):
+    """AGP lines from a path (plain or gzipped), or from its text."""
+    if isinstance(agp, str) and "\n" in agp:
+        return io.StringIO(agp).readlines()
+    with rp.Open(agp) as f:
+        return list(f)
+
+
+def curate(tpfdata, agp, params=None, caches=None, breaks=None):
+    """Fit the TPF from load_tpf() to agp (lines from read_agp(), or a path) and return a Result.
+
+    Nothing is written. caches, from new_caches(), makes repeated calls on
+    edits of the same AGP only recompute the scaffolds that changed; it is
+    emptied whenever tpfdata or params differ from the last call's. breaks
+    (a dividers.tsv style path or lines, or a dict from
+    rapid_pretext2tpf.read_breaks) gives exact break coordinates, as --breaks.
+    """
+    params = Params() if params is None else params
+    if caches:
+        _check_caches(caches, tpfdata, params)
+    else:
+        caches = {"nearest": None, "breaktpf": None, "outputlist": None}
+    report = io.StringIO()
+    with _settings(params), contextlib.redirect_stdout(report):
+        try:
+            if breaks is not None and not isinstance(breaks, dict):
+                breaks = rp.read_breaks(breaks)
+            out = rp.run_agp(tpfdata, agp, None, caches, breaks)
+        except rp.CurationStop as e:
+            return Result(ok=False, errors=e.errors, report=report.getvalue())
+    return Result(
+        ok=True,
+        report=report.getvalue(),
+        dividers=out["dividers.tsv"],
+        tpf=out["rapid_prtxt.tpf"],
+        haps=out["haps_rapid_prtxt.tpf"],
+        sanity=out["sanity"],
+        joins=out["joins"],
+    )
+
+
+def write_result(result, outdir="", prefix=""):
+    """Write a Result's dividers.tsv, rapid_prtxt.tpf and haps TPF as the command line would, returning their paths."""
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
+    tpfout = os.path.join(outdir, prefix + "rapid_prtxt.tpf")
+    dividers = os.path.join(outdir, prefix + "dividers.tsv")
+    rp.write_dividers(result.dividers, dividers)
+    rp.write_output_tpf(result.tpf, tpfout)
+    rp.write_hap_tpf(result.haps, tpfout)
+    return dividers, tpfout, rp.hap_path(tpfout)
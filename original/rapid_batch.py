@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+'''
+Runs rapid_pretext2tpf.py over many curations at once.
+
+The manifest has one job per line - tpf, agp and output directory, tab separated (relative
+paths are taken from the manifest's directory, # lines are comments).  Jobs run in a pool of
+long lived worker processes that import rapid_pretext2tpf once and call load_tpf/run_agp in
+process, so no job pays for an interpreter start.  A failure, an AGP tag error or a crash
+stays with that job: its stdout/stderr go to outdir/rapid_prtxt.log and its per stage stats
+to outdir/rapid_prtxt_profile.json.  A summary table of every job is printed at the end (and
+optionally written as tsv).  peak_rss_mb is the peak of the worker that ran the job, so it
+includes any larger job that worker ran before it.
+
+	python rapid_batch.py manifest.tsv -j 8 --summary batch_summary.tsv
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor
+
+import rapid_pretext2tpf as rp
+
+LOG="rapid_prtxt.log"
+PROFILE="rapid_prtxt_profile.json"
+COLUMNS=["job","tpf","agp","outdir","status","wall_s","peak_rss_mb","dividers","breaks","out_lines"]
+
+
+#[(tpf,agp,outdir), ...] from the manifest
+def read_manifest(manifest):
+
+	base=os.path.dirname(os.path.abspath(manifest))
+	jobs=[]
+	with open(manifest) as f:
+		for n,line in enumerate(f,1):
+			if line.startswith("#") or not line.strip():
+				continue
+			x=line.strip().split("\t")
+			if len(x)!=3:
+				sys.exit(manifest+" line "+str(n)+": expected tpf, agp and outdir, tab separated")
+			jobs.append(tuple(os.path.join(base,i) for i in x))
+	return jobs
+
+
+#Last non blank line of a job log, the most useful one-line reason a job stopped
+def last_line(log):
+
+	try:
+		with open(log) as f:
+			lines=[line.strip() for line in f if line.strip()]
+	except OSError:
+		return ""
+	return lines[-1] if lines else ""
+
+
+#Runs one job in a pool worker, as rapid_pretext2tpf.py tpf agp --profile would inside outdir, and returns its summary row.  The
+#worker keeps the module between jobs, so its errors and profile globals are reset first
+def run_job(job,tpf,agp,outdir):
+
+	row={"job":job,"tpf":tpf,"agp":agp,"outdir":outdir}
+	try:
+		os.makedirs(outdir,exist_ok=True)
+		log=os.path.join(outdir,LOG)
+		profile=os.path.join(outdir,PROFILE)
+		if os.path.exists(profile):
+			os.remove(profile)
+		tpfout=os.path.join(outdir,"rapid_prtxt.tpf")
+		dividers=os.path.join(outdir,"dividers.tsv")
+		outputs={"dividers.tsv":dividers,"dividers.tsv.sig":rp.sig_path(dividers),"rapid_prtxt.tpf":tpfout,"haps_rapid_prtxt.tpf":rp.hap_path(tpfout)}
+		rp.errors.clear()
+		rp.profile=[]
+		rc=0
+		t0=time.perf_counter()
+		cpu=time.process_time()
+		with open(log,'w') as fout, redirect_stdout(fout), redirect_stderr(fout):
+			try:
+				rp.run_agp(rp.load_tpf(tpf),agp,outputs,{"nearest":None,"breaktpf":None,"outputlist":None})
+			except rp.CurationStop:	#input errors, already printed to the log
+				pass
+			except Exception:
+				traceback.print_exc()
+				rc=1
+			finally:
+				rp.write_profile(profile,tpf,agp,time.perf_counter()-t0,time.process_time()-cpu)
+		row["wall_s"]=round(time.perf_counter()-t0,3)
+	except OSError as e:
+		row["status"]="error: "+str(e)
+		return row
+
+	stages={}
+	if os.path.exists(profile):
+		with open(profile) as f:
+			stats=json.load(f)
+		row["peak_rss_mb"]=stats["peak_rss_mb"]
+		stages={r["stage"]:r for r in stats["stages"]}
+	row["breaks"]=stages.get("nearest",{}).get("items")
+	row["out_lines"]=stages.get("outputlist",{}).get("items")
+	row["dividers"]=stages.get("agp_dividers",{}).get("items")
+	if rc!=0:
+		row["status"]="failed: "+last_line(log)
+	elif "tpf_sanity" not in stages:	#stopped on an input error
+		row["status"]="stopped: "+last_line(log)
+	else:
+		row["status"]="ok"
+	return row
+
+
+def print_summary(rows,outfile=None):
+
+	table=[COLUMNS]+[[str(r.get(c,"")) if r.get(c) is not None else "-" for c in COLUMNS] for r in rows]
+	widths=[max(len(r[i]) for r in table) for i in range(len(COLUMNS))]
+	for r in table:
+		print("  ".join(v.ljust(w) for v,w in zip(r,widths)).rstrip())
+	ok=sum(1 for r in rows if r["status"]=="ok")
+	print("\n"+str(ok)+" of "+str(len(rows))+" jobs ok")
+	if outfile:
+		with open(outfile,'w') as fout:
+			for r in table:
+				fout.write("\t".join(r)+"\n")
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description='Run rapid_pretext2tpf.py over a manifest of tpf/agp/outdir jobs in parallel.')
+	parser.add_argument('manifest', type=str, help='tab separated tpf, agp, outdir per line')
+	parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='jobs to run at once (default: cpu count)')
+	parser.add_argument('--summary', type=str, help='also write the summary table here as tsv')
+	args = parser.parse_args()
+
+	jobs=read_manifest(args.manifest)
+	#Each worker process imports rapid_pretext2tpf once and runs job after job in process
+	with ProcessPoolExecutor(max_workers=max(1,min(args.jobs,len(jobs)))) as pool:
+		rows=list(pool.map(run_job,range(1,len(jobs)+1),*zip(*jobs)))
+	print_summary(rows,args.summary)
+	if any(r["status"]!="ok" for r in rows):
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -28,14 +28,29 @@ SOFTWARE.
 
 '''
 
+import os
 import sys
+import json
+import time
+import pickle
+import hashlib
+import atexit
 import argparse
-import pyfastaq
 import subprocess
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from contextlib import nullcontext
 from datetime import datetime
+from zopen import Open, atomic_write	#plain, gzip or BGZF input; outputs renamed into place once complete
+try:
+	import resource	#peak RSS for --profile, unix only
+except ImportError:
+	resource=None
 
 '''
 #rapid_pretext2tpf_XL.py has now been written for large fragmented genomes!!  For small genomes with few gaps this program is fine and quicker to use.
+#The XL behaviour is also here now: --breaks takes exact break coordinates (eg a checked dividers.tsv) and splits components at them.
 #A known issue is that we are filtering away small agp fragments.  If we have a large highly fragmented genome
 #requiring lots of breaking, we may legitimately create small fragments which could get discarded by this method.
 #For full curation, we know the precise break coordinates which enables us to solve this problem with certainty.  
@@ -65,8 +80,28 @@ lowcutoff=1.5	#how many texels smaller than the smallest contig in this scaffold
 #NB there is no wholesale texel length cutoff, lowcutoff performs this role more intelligently on a per scaffold basis
 sex=["X","Y","Z","W"]
 prefix="R"
+adaptive=False	#--adaptive: size each scaffold's search window from its own components and the agp's map resolution (search_radii) instead of netsize texels
+fitting="nearest"	#how agp dividers find their tpf component ends: "nearest" snaps each on its own, "align" fits each scaffold's dividers together (align_ends)
 borderlen=80
 errors={}
+profile=None	#per stage records, a list once --profile is given
+
+
+#Raised where the script stops on input errors it has already printed.  A SystemExit with no code, so the command line exits
+#quietly with status 0 as before, while rapid_api.curate() catches it and hands back errors ({kind: [details]})
+class CurationStop(SystemExit):
+
+	def __init__(self,errors):
+		super().__init__()
+		self.errors=errors
+
+
+#A path (plain, gzip or BGZF) or lines already in memory, opened the same way
+def lines_in(src):
+
+	if isinstance(src,(str,bytes,os.PathLike)):
+		return Open(src)
+	return nullcontext(src)
 	
 
 def append_dict(k,v,d):
@@ -78,30 +113,30 @@ def append_dict(k,v,d):
 	return d
 
 
-#Takes dictionary as input
-def genome_size(tpfdict):
+#Everything the run needs to know about the input assembly's size, in one pass over the table's component rows per scaffold:
+#gsize - total component bp, texel - bp per texel of the 32768 texel map, scafflens - each scaffold's highest end coordinate,
+#minctg - each scaffold's shortest component (end-start, as the small fragment filter in scaffs_from_agp has always measured it)
+def assembly_stats(table,tpfdict):
 
+	start=table["start"]
+	end=table["end"]
+	gap=table["gap"]
 	total=0
-	totals={}
+	scafflens={}
+	minctg={}
 	for k,v in tpfdict.items():
-		for line in v:
-			x=line.split()
-			if not "GAP" in line:
-				scaff=x[1].split(":")[0]
-				hi=int(x[1].split("-")[1])
-				lo=int(x[1].split(":")[1].split("-")[0])
-				amount=(hi-lo)+1
-				if scaff not in totals:
-					totals[scaff]=amount
-				else:
-					totals[scaff]+=amount
-				
-	for k,v in totals.items():
-		total+=v
-		
-	texel=small=int(round(total/32768,0))
+		rows=[row for row in v if not gap[row]]
+		if not rows:
+			continue
+		ends=[end[row] for row in rows]
+		spans=[e-start[row] for e,row in zip(ends,rows)]
+		total+=sum(spans)+len(spans)
+		scafflens[k]=max(ends)
+		minctg[k]=min(spans)
 
-	return total,texel
+	texel=int(round(total/32768,0))
+
+	return {"gsize":total,"texel":texel,"scafflens":scafflens,"minctg":minctg}
 
 
 #Takes line list as input	
@@ -134,21 +169,45 @@ def make_date_string():
 	return r[0].replace("-","")
 
 
-def complement_scaffold(scaff_line_list):
-	x=scaff_line_list[::-1]
-	newlines=[]
-	for line in x:
-		if "PLUS" in line:
-			newlines.append(line.replace("PLUS","MINUS"))	
-		elif "MINUS" in line:
-			newlines.append(line.replace("MINUS","PLUS"))
-		else:
-			newlines.append(line)	
+#Takes tpf table rows, returns (row,flip) pairs in reverse order - the strand flip is applied when the line is written out
+def complement_scaffold(scaff_row_list):
+	x=scaff_row_list[::-1]
+	newrows=[]
+	for row in x:
+		newrows.append((row,True))
 
-	return newlines
+	return newrows
 	
 
-def scaffs_from_agp(agp,fragsize,scafflens,ctg_lengths,texel):
+#One agp line.  low/high are the superscaffold coordinates, type the component type (W, or U for a gap) and scaff, start, end and
+#orientation the component columns (start/end are 0 for gaps).  tags are the upper cased columns after orientation and line the raw text
+AgpLine=namedtuple("AgpLine",["linenum","superscaff","low","high","part","type","scaff","start","end","orientation","tags","line"])
+
+
+#Reads an agp (a path or its lines) once into AgpLine records for every stage that needs it, skipping blank lines and comments bar
+#PretextView's "# HiC MAP RESOLUTION: 11889.944305 bp/texel" header, returned as bp per texel (None if there isn't one)
+def parse_agp(agp):
+
+	records=[]
+	resolution=None
+	with lines_in(agp) as f:
+		for linenum,line in enumerate(f,1):
+			if line.startswith("# HiC MAP RESOLUTION:"):
+				try:
+					resolution=float(line.split(":")[1].split()[0])
+				except (IndexError,ValueError):
+					pass
+			if line[0] != "#" and line !="\n":
+				x=line.strip().split()
+				if x[4] != "U":	#is not a gap
+					records.append(AgpLine(linenum,x[0],int(x[1]),int(x[2]),x[3],x[4],x[5],int(x[6]),int(x[7]),x[8],tuple(t.upper() for t in x[9:]),line))
+				else:
+					records.append(AgpLine(linenum,x[0],int(x[1]),int(x[2]),x[3],x[4],x[5],0,0,x[8],(),line))
+	return records,resolution
+
+
+#minctg None keeps every agp fragment however small (exact --breaks)
+def scaffs_from_agp(agprecords,fragsize,minctg,texel):
 
 	sscaffdict={}
 	discards={}
@@ -158,61 +217,51 @@ def scaffs_from_agp(agp,fragsize,scafflens,ctg_lengths,texel):
 	allsex=[]
 	nohap_sex=""
 	scaff_with_haplo=[]
-	with open(agp, 'r') as f:
-		for line in f:
-			#ßprint(line)
-			if line[0] != "#"and line !="\n":
-				x=line.strip().split()
-				superscaff=x[0]
-				cumulativelow=x[1]
-				cumulativehigh=x[2]
-				frag=int(cumulativehigh)-int(cumulativelow)
-				scaff=x[5]
-				orientation=x[8]
-				entry=x[4]
-				if entry != "U":	#is not a gap
-					low=int(x[6])
-					high=int(x[7])
-					vals=[scaff,low,high,orientation,cumulativelow,cumulativehigh]
-					append_dict(superscaff,line,agplines)
-					##print(superscaff)
-					if frag > 10*texel:	#always take agp frags above this size - never get an artefact bigger than 10 texels
-						append_dict(superscaff,vals,sscaffdict)
-					else:	#If fragment is small...
-						if frag > min(ctg_lengths[scaff])-lowcutoff*texel:	#take if small but bigger than smallest contig by a margin
-							#print(f'{frag} > {min(ctg_lengths[scaff])}-{lowcutoff}*{texel}')
-							append_dict(superscaff,vals,sscaffdict)
+	for r in agprecords:
+		if r.type != "U":	#is not a gap
+			superscaff=r.superscaff
+			frag=r.high-r.low
+			scaff=r.scaff
+			low=r.start
+			high=r.end
+			vals=[scaff,low,high,r.orientation,r.low,r.high]
+			append_dict(superscaff,r,agplines)
+			##print(superscaff)
+			if minctg is None or frag > 10*texel:	#always take agp frags above this size - never get an artefact bigger than 10 texels
+				append_dict(superscaff,vals,sscaffdict)
+			else:	#If fragment is small...
+				if frag > minctg[scaff]-lowcutoff*texel:	#take if small but bigger than smallest contig by a margin
+					#print(f'{frag} > {minctg[scaff]}-{lowcutoff}*{texel}')
+					append_dict(superscaff,vals,sscaffdict)
+				else:
+					#print('Here!')
+					append_dict(scaff,low,discards)		#discard everything else
+			#print(sscaffdict)
+			#Get the tags
+			s=list(r.tags)
+			if s:
+				unqkey="/".join([scaff,str(low),str(high)])
+				##print(unqkey, s)
+				if "HAPLOTIG" in s and "UNLOC" in s:
+					msg=scaff+" is both \'Haplotig\' and \'unloc\' - needs to be one or the other\n"
+					append_dict("hap_unloc",msg,errors)
+				if "HAPLOTIG" in s:
+					scaff_with_haplo.append(superscaff)
+				if "W" in s:
+					nohap_sex="W"
+				if "Y" in s:
+					nohap_sex="Y"	
+				for sx in sex:
+					if sx in s:
+						if sx not in allsex:
+							allsex.append(sx)
+						if sx not in sexchrm:
+							sexchrm[sx]=[superscaff]	#Starting a check to see if eg Z chr is referenced in >1 chrm
 						else:
-							#print('Here!')
-							append_dict(scaff,low,discards)		#discard everything else
-					#print(sscaffdict)
-					#Get the tags
-					s=[]
-					if len(x)>9:
-						unqkey="/".join([scaff,str(low),str(high)])
-						##print(unqkey, x[8:])
-						for i in range(len(x[9:])):
-							s.append(x[9:][i].upper())
-						if "HAPLOTIG" in s and "UNLOC" in s:
-							msg=scaff+" is both \'Haplotig\' and \'unloc\' - needs to be one or the other\n"
-							append_dict("hap_unloc",msg,errors)
-						if "HAPLOTIG" in s:
-							scaff_with_haplo.append(superscaff)
-						if "W" in s:
-							nohap_sex="W"
-						if "Y" in s:
-							nohap_sex="Y"	
-						for sx in sex:
-							if sx in s:
-								if sx not in allsex:
-									allsex.append(sx)
-								if sx not in sexchrm:
-									sexchrm[sx]=[superscaff]	#Starting a check to see if eg Z chr is referenced in >1 chrm
-								else:
-									if superscaff not in sexchrm[sx]:
-										sexchrm[sx].append(superscaff)	
-						
-						append_dict(unqkey,s,tagdict)
+							if superscaff not in sexchrm[sx]:
+								sexchrm[sx].append(superscaff)	
+				
+				append_dict(unqkey,s,tagdict)
 
 	if len(allsex)>2:
 		msg = "Too many sex chromosomes - you have "+" ".join(allsex)
@@ -253,10 +302,14 @@ def scaffs_from_agp(agp,fragsize,scafflens,ctg_lengths,texel):
 	return sscaffdict, discards, agplines, tagdict, sexchrm
 
 
-def tpf_sanity(tpfout):
+#Parses a written tpf (or its lines, reported as tpfout) and runs the native sanity checks over it (replaces test_tpf_sanity.pl -scafflevel)
+def tpf_sanity(tpfout,lines=None):
 
-	cmd="perl /software/grit/projects/vgp_curation_scripts/test_tpf_sanity.pl -scafflevel "+tpfout
-	pyfastaq.utils.syscall(cmd)
+	table,tpfdict,errors2=parse_tpf(tpfout if lines is None else lines,False)	#output is reordered on purpose, so no typo collection
+	problems=validate_tpf(table,tpfdict)
+	report_sanity(tpfout,problems)
+
+	return problems
 
 
 def location(f):
@@ -267,45 +320,278 @@ def location(f):
 	return b
 
 	
-#Gets tpf lines and checks for typos in coordinates (some coordinates may be added manually so we check them)
-def parse_tpf(tpf):
+STRANDS={"PLUS":1,"MINUS":-1}
+STRANDNAMES={1:"PLUS",-1:"MINUS",0:"?"}
+
+
+#Columnar tpf table - one row per tpf line held in typed arrays instead of as line strings.  acc (the first, accession column),
+#scaff (the component's scaffold) and name (the output scaffold column) index into the shared names list, strand is 1/-1 for
+#PLUS/MINUS (0 if it is anything else or missing) and gap rows keep their whole line text in names via name, so identical gap
+#lines are only stored once
+def tpf_table():
+
+	return {"names":[],"ids":{},"acc":array("l"),"scaff":array("l"),"start":array("q"),"end":array("q"),"strand":array("b"),"name":array("l"),"gap":array("b")}
+
+
+def name_id(table,name):
+
+	ids=table["ids"]
+	if name not in ids:
+		ids[name]=len(table["names"])
+		table["names"].append(name)
+	return ids[name]
+
+
+def add_row(table,scaff,start,end,strand,name,gap,acc="?"):
+
+	table["acc"].append(name_id(table,acc))
+	table["scaff"].append(name_id(table,scaff))
+	table["start"].append(start)
+	table["end"].append(end)
+	table["strand"].append(strand)
+	table["name"].append(name_id(table,name))
+	table["gap"].append(gap)
+	return len(table["gap"])-1
+
+
+#eg scaffold_1:1-2795873
+def component(table,row):
+
+	return table["names"][table["scaff"][row]]+":"+str(table["start"][row])+"-"+str(table["end"][row])
+
+
+#Rebuilds the tab separated tpf line for a row, optionally renamed and/or with the strand complemented
+def tpf_line(table,row,name=None,flip=False):
+
+	if table["gap"][row]:
+		return table["names"][table["name"][row]]
+	if name is None:
+		name=table["names"][table["name"][row]]
+	strand=table["strand"][row]
+	if flip:
+		strand=-strand
+	return table["names"][table["acc"][row]]+"\t"+component(table,row)+"\t"+name+"\t"+STRANDNAMES[strand]
+
+
+#Coordinate maps - prefix sums over a scaffold's pieces so a bp position is found by bisect rather than by walking its components.
+#pieces are (scaff,start,end,strand) components or int gap lengths; starts[i] is the 1 based position where piece i begins and
+#bysource holds, per source scaffold, its components' source starts (sorted) and piece indices for lookups the other way
+def coord_map(pieces,starts=None):
+
+	if starts is None:	#laid end to end, as the fasta built from a tpf scaffold
+		starts=array("q")
+		pos=1
+		for p in pieces:
+			starts.append(pos)
+			pos+=p if isinstance(p,int) else p[2]-p[1]+1
+	bysource={}
+	for i,p in enumerate(pieces):
+		if not isinstance(p,int):
+			append_dict(p[0],(p[1],i),bysource)
+	for k,v in bysource.items():
+		v.sort()
+		bysource[k]=([lo for lo,i in v],[i for lo,i in v])
+	last=pieces[-1] if pieces else 0
+	length=starts[-1]+(last-1 if isinstance(last,int) else last[2]-last[1]) if pieces else 0
+	return {"pieces":pieces,"starts":starts,"length":length,"bysource":bysource}
+
+
+#Output side map for one scaffold's tpf lines (eg a superscaffold of rapid_prtxt.tpf)
+def layout_map(lines):
+
+	pieces=[]
+	for line in lines:
+		x=line.split()
+		if "gap" in line.lower():
+			pieces.append(int(x[2]))
+		else:
+			comp=x[1].split(":")
+			lo,hi=comp[1].split("-")
+			pieces.append((comp[0],int(lo),int(hi),STRANDS.get(x[3],1)))
+	return coord_map(pieces)
+
+
+#Source side map for each input scaffold - positions are the components' own coordinates, so the pieces are its components (in
+#tpf order) starting where they say they do, and a position between two of them is in a gap.  rows[i] is piece i's table row
+def source_maps(table,tpfdict):
+
+	maps={}
+	start=table["start"]
+	end=table["end"]
+	gap=table["gap"]
+	for k,v in tpfdict.items():
+		rows=[row for row in v if not gap[row]]
+		cmap=coord_map([(k,start[row],end[row],1) for row in rows],array("q",(start[row] for row in rows)))
+		cmap["rows"]=rows
+		maps[k]=cmap
+	return maps
+
+
+#Batch lookup of positions in a coord_map - (piece index, source scaffold, source bp) for each, or None where it falls in a gap or off the end
+def map_to_source(cmap,positions):
+
+	pieces=cmap["pieces"]
+	starts=cmap["starts"]
+	found=[]
+	for pos in positions:
+		i=bisect_right(starts,pos)-1
+		p=pieces[i] if i>=0 else 0
+		if isinstance(p,int) or pos-starts[i]>p[2]-p[1]:
+			found.append(None)
+			continue
+		offset=pos-starts[i]
+		found.append((i,p[0],p[2]-offset if p[3]==-1 else p[1]+offset))
+	return found
+
+
+#Batch lookup the other way - the position of each (source scaffold, source bp) in a coord_map, or None where no component holds it
+def map_from_source(cmap,queries):
+
+	pieces=cmap["pieces"]
+	starts=cmap["starts"]
+	bysource=cmap["bysource"]
+	found=[]
+	for scaff,bp in queries:
+		if scaff not in bysource:
+			found.append(None)
+			continue
+		los,idx=bysource[scaff]
+		j=bisect_right(los,bp)-1
+		if j<0 or bp>pieces[idx[j]][2]:
+			found.append(None)
+			continue
+		i=idx[j]
+		p=pieces[i]
+		found.append(starts[i]+(p[2]-bp if p[3]==-1 else bp-p[1]))
+	return found
+
+
+#Gets tpf lines and checks for typos in coordinates (some coordinates may be added manually so we check them).  typos=False skips
+#that check, for output tpfs
+def parse_tpf(tpf,typos=True):
 
 	prevscaff=""
+	table=tpf_table()
 	result={}
-	coordtest={}	#Checking for obvious coord typos in the input tpf
+	coordtest={}	#Checking for obvious coord typos in the input tpf - highest end coordinate so far for each scaffold
 	errors2=[]
-	with open(tpf,'r') as f:
+	flagged=set()	#errors2 as a set, for the membership test
+	with lines_in(tpf) as f:
 
 		for line in f:
 			if not "gap" in line.lower():
 				x=line.split()
 				scaff=x[2]
-				lo=x[1].split(":")[1].split("-")[0]
-				hi=x[1].split(":")[1].split("-")[1]
-				if scaff in coordtest:
-					if int(lo)<=max(coordtest[scaff]):	#If coord is less than previous line
-						if line not in errors2:
-							errors2.append(line)
-							
-					if int(hi)<=max(coordtest[scaff]):
-						if line not in errors2:
-							errors2.append(line)
-							
-					if int(lo)>=int(hi):
-						if line not in errors2:
-							errors2.append(line)
-							
-				append_dict(scaff,int(hi),coordtest)
-				if scaff not in result:
-					result[scaff]=[line]
-					prevscaff=scaff
-				else:
-					result[scaff].append(line)
-					prevscaff=scaff
+				comp=x[1].split(":")
+				lo=int(comp[1].split("-")[0])
+				hi=int(comp[1].split("-")[1])
+				if typos:
+					if scaff in coordtest:
+						if lo<=coordtest[scaff] or hi<=coordtest[scaff] or lo>=hi:	#If coord is less than previous line, or the component is back to front
+							if line not in flagged:
+								flagged.add(line)
+								errors2.append(line)
+						if hi>coordtest[scaff]:
+							coordtest[scaff]=hi
+					else:
+						coordtest[scaff]=hi
+				row=add_row(table,comp[0],lo,hi,STRANDS.get(x[3] if len(x)>3 else "?",0),scaff,0,x[0])
+				append_dict(scaff,row,result)
+				prevscaff=scaff
 			else:
-				result[prevscaff].append(line)
-
-	return result, errors2
+				row=add_row(table,"",0,0,0,line.strip(),1)
+				append_dict(prevscaff,row,result)	#a gap before any component is kept under "" for validate_tpf to report
+
+	return table, result, errors2
+
+
+#Scaffold level tpf sanity checks in a single pass over the table, in tpf order.  Rows are tpf lines so row+1 is the line
+#number.  Returns {check:[(line number,scaffold,message)]} for:
+#coordinates - start must be >= 1 and <= end (ordering within an input scaffold is checked by parse_tpf, curated output is reordered on purpose)
+#overlap - a component must not overlap any other component of its source scaffold, wherever it is placed
+#gap - no gaps at the start or end of a scaffold and no consecutive gaps
+#strand - strand must be PLUS or MINUS
+#Overlaps are found by one sort per source scaffold first, so only sources that have one go through the placed-so-far check
+def validate_tpf(table,tpfdict):
+
+	problems={}
+	names=table["names"]
+	scaffcol=table["scaff"]
+	start=table["start"]
+	end=table["end"]
+	strand=table["strand"]
+	gap=table["gap"]
+	overlapping=overlapping_sources(table,tpfdict)
+	placed={}	#source scaffold - [sorted starts, matching (start,end) intervals] of the components seen so far
+	for k,v in tpfdict.items():
+		prev=None	#previous row in this scaffold
+		for e,row in enumerate(v):
+			if gap[row]:
+				if e==0 or e==len(v)-1:
+					append_dict("gap",(row+1,k,"gap at scaffold end"),problems)
+				elif gap[prev]:
+					append_dict("gap",(row+1,k,"consecutive gaps"),problems)
+				prev=row
+				continue
+			comp=component(table,row)
+			lo=start[row]
+			hi=end[row]
+			if lo<1 or lo>hi:
+				append_dict("coordinates",(row+1,k,comp+" start must be >= 1 and <= end"),problems)
+			if strand[row]==0:
+				append_dict("strand",(row+1,k,comp+" strand is not PLUS or MINUS"),problems)
+			source=names[scaffcol[row]]
+			if source not in overlapping:
+				prev=row
+				continue
+			if source not in placed:
+				placed[source]=[[],[]]
+			starts,intervals=placed[source]
+			i=bisect_right(starts,lo)
+			if (i>0 and intervals[i-1][1]>=lo) or (i<len(starts) and starts[i]<=hi):
+				other=intervals[i-1] if i>0 and intervals[i-1][1]>=lo else intervals[i]
+				append_dict("overlap",(row+1,k,comp+" overlaps "+source+":"+str(other[0])+"-"+str(other[1])),problems)
+			else:	#only non-overlapping intervals are kept, so the neighbours are enough to find an overlap
+				starts.insert(i,lo)
+				intervals.insert(i,(lo,hi))
+			prev=row
+
+	return problems
+
+
+#Source scaffolds (name ids) with any two components overlapping, or a back to front one, from a sort of each source's components
+def overlapping_sources(table,tpfdict):
+
+	scaffcol=table["scaff"]
+	start=table["start"]
+	end=table["end"]
+	gap=table["gap"]
+	bysource={}
+	for v in tpfdict.values():
+		for row in v:
+			if not gap[row]:
+				append_dict(scaffcol[row],(start[row],end[row]),bysource)
+	overlapping=set()
+	for k,v in bysource.items():
+		v.sort()
+		reach=None
+		for lo,hi in v:
+			if lo>hi or (reach is not None and lo<=reach):
+				overlapping.add(k)
+				break
+			reach=hi if reach is None else max(reach,hi)
+
+	return {table["names"][k] for k in overlapping}
+
+
+def report_sanity(tpf,problems):
+
+	if len(problems)>0:
+		print("\n"+tpf+" failed sanity checks:\n")
+		for k,v in problems.items():
+			for linenum,scaff,msg in v:
+				print(k+"\tline "+str(linenum)+"\t"+scaff+"\t"+msg)
+		print("")
 
 
 def report_errors(errors2):
@@ -314,7 +600,7 @@ def report_errors(errors2):
 		#print("coordinate errors detected amongst the following tpf lines - presumed typos:\n")
 		for e in errors2:
 			print(e)
-		sys.exit()
+		raise CurationStop({"tpf_coordinates":errors2})
 
 
 def check_components(lines):
@@ -328,14 +614,14 @@ def check_components(lines):
 	return check
 
 
-def components_from_dict(tpf):
+def components_from_dict(table,tpf):
 
 	check=[]
+	gap=table["gap"]
 	for k,v in tpf.items():
-		for l in v:
-			if not "GAP" in l:
-				comp=l.split()[1]
-				check.append(comp)
+		for row in v:
+			if not gap[row]:
+				check.append(component(table,row))
 
 	return check
 
@@ -357,42 +643,178 @@ def agp_dividers(agpdict):
 	return result
 
 
-#dividers is agp dividing coordinates - here we add the agp coord into our results key with scaff name, then add the closest tpf coord that meets our parameterised requirements
-def nearest(tpfdict,dividers,fragsize,discards,scafflen):
-	#waypoint
-	closest={}	#scaff:agpdiv key - val is closest tpf max
-	results={}
+#Sorted tpf component end coordinates for each scaffold, built once from parse_tpf output so nearest() can bisect instead of scanning every line for every divider
+def tpf_index(table,tpfdict):
+
+	index={}
+	end=table["end"]
+	gap=table["gap"]
+	for k,v in tpfdict.items():
+		ends=[]
+		for row in v:
+			if not gap[row]:
+				ends.append(end[row])	#scaff_end
+		index[k]=sorted(ends)	#parse_tpf/report_errors guarantee ascending ends, so sorted order is also tpf order
+
+	return index
+
+
+#scaff:agpdiv key - val is closest tpf max.  Only the tpf ends inside the net (abs(tmax-div) < net) can match, so bisect straight to them.
+#radii (from search_radii) replaces the net per scaffold
+def closest_ends(tpfindex,dividers,fragsize,radii=None):
+
+	closest={}
 	for k,v in dividers.items():
+		net=netsize*fragsize if radii is None else radii[k]	#throw a wide net but not too wide (in testing >4 misses breaks in highly fragmented genomes - this just means that the tpfchunks stay together rather than splitting fully to match the agp)
+		ends=tpfindex[k]
 		for div in v:
-			for line in tpfdict[k]:
-				if not "GAP" in line:
-					tmax=int(line.split()[1].split("-")[1]) #scaff_end
-					##print(k,line.strip(),div,tmax)	
-					pre=k+":"+str(div)
-
-					if abs(tmax-div) < netsize*fragsize:			#throw a wide net but not too wide (in testing >4 misses breaks in highly fragmented genomes - this just means that the tpfchunks stay together rather than splitting fully to match the agp)
-						if pre not in closest:
-							#print(f'{tmax} - {div} | {netsize} * {fragsize}')
-							#print(pre, tmax)
-							closest[pre]=tmax
-						else:
-							if abs(tmax-div)<abs(tmax-closest[pre]):	#but get the closest
-								#print(f'{abs(tmax-div)}<{abs(tmax-closest[pre])}')
-								#print(k)
-								closest[pre]=tmax
-	#[print(i) for i in closest]
+			pre=k+":"+str(div)
+			for tmax in ends[bisect_right(ends,div-net):bisect_left(ends,div+net)]:
+				if pre not in closest:
+					closest[pre]=tmax
+				else:
+					if abs(tmax-div)<abs(tmax-closest[pre]):	#but get the closest
+						closest[pre]=tmax
+
+	return closest
+
+
+#--adaptive search radius (bp) for each scaffold, in place of netsize texels everywhere.  A PretextView divider lands within about a
+#texel of the cut the curator meant (resolution - bp per texel from the agp header, else the tpf's texel), so no radius is smaller than
+#that.  Past that it follows the spacing of the scaffold's own component ends - half its lower quartile component length, up to the
+#usual netsize texels - so in a dense, fragmented scaffold the window can't reach past the neighbouring ends while sparse scaffolds keep
+#the full net.  One sort per scaffold, the lookups stay a bisect into tpfindex
+def search_radii(table,tpfdict,texel,resolution=None):
+
+	res=resolution or texel
+	start=table["start"]
+	end=table["end"]
+	gap=table["gap"]
+	radii={}
+	for k,v in tpfdict.items():
+		lens=sorted(end[row]-start[row]+1 for row in v if not gap[row])
+		if lens:
+			radii[k]=max(res,min(netsize*res,lens[len(lens)//4]/2))
+
+	return radii
+
+
+#One row of the align_ends table - the lowest displacement for dividers up to this one using only tpf ends below index j, for any j
+def align_cost(row,j):
+
+	lo,hi,base,vals,how,tail,tailhow=row
+	if j<lo:
+		return base
+	if j>=hi:
+		return tail
+	return vals[j-lo]
+
+
+#scaff:agpdiv key - val is the tpf end, as closest_ends, but each scaffold's sorted dividers are aligned to its sorted tpf ends as a whole:
+#no two dividers share an end, order is kept and total displacement is lowest.  Banded dynamic programming - a divider can only take
+#the ends inside its net, so each row only covers those (lo to hi) and everything either side of the band is one carried value, making
+#it O(dividers x ends in the net) per scaffold.  Leaving a divider unaligned costs a whole net, and one left unaligned gets no end at
+#all (any end in its reach is already taken or out of order), so scaffold_dividers reports it as a missing break
+def align_ends(tpfindex,dividers,fragsize,radii=None):
+
+	closest={}
+	for k,v in dividers.items():
+		net=netsize*fragsize if radii is None else radii[k]
+		ends=tpfindex[k]
+		divs=sorted(set(v))
+		rows=[(0,0,0,[],[],0,"s")]	#no dividers yet costs nothing
+		for div in divs:
+			prev=rows[-1]
+			lo=bisect_right(ends,div-net)
+			hi=bisect_left(ends,div+net)
+			base=align_cost(prev,lo-1)+net
+			vals=[]
+			how=[]
+			left=base
+			for j in range(lo,hi):
+				best=min((align_cost(prev,j-1)+abs(ends[j]-div),0,"a"),(left,1,"c"),(align_cost(prev,j)+net,2,"s"))	#align to end j, use an end below j, or leave unaligned
+				vals.append(best[0])
+				how.append(best[2])
+				left=best[0]
+			tail,tailhow=min((left,"c"),(prev[5]+net,"s"))
+			rows.append((lo,hi,base,vals,how,tail,tailhow))
+
+		aligned={}
+		i=len(divs)
+		j=len(ends)
+		while i>0:
+			lo,hi,base,vals,how,tail,tailhow=rows[i]
+			step=tailhow if j>=hi else "s" if j<lo else how[j-lo]
+			if step=="c":
+				j=min(j,hi)-1
+				continue
+			if step=="a":
+				aligned[divs[i-1]]=ends[j]
+				j-=1
+			i-=1
+
+		for div,tmax in aligned.items():
+			closest[k+":"+str(div)]=tmax
+
+	return closest
+
+
+#closest tpf end to each of one scaffold's agp dividers, plus the dividers with none in reach that a discarded agp fragment doesn't explain
+def scaffold_dividers(tpfindex,k,v,fragsize,discards,radii=None):
+
+	if fitting=="align":
+		closest=align_ends(tpfindex,{k:v},fragsize,radii)
+	else:
+		closest=closest_ends(tpfindex,{k:v},fragsize,radii)
+	missing=[]
+	for div in v:
+		if k+":"+str(div) not in closest:
+			##print(k, div, "not found!")
+			if not any(div+1 == int(d) for d in discards.get(k,[])):	#It's ok if this was discarded as fragment artefact
+				missing.append(k+"\t"+str(div))
+	return closest,missing
+
+
+#Everything one scaffold's breakpoints depend on - its tpf component ends, agp dividers and discards, and the fitting settings - as
+#one short hash, written beside dividers.tsv so a later --dividers run can tell which scaffolds it still holds good for
+def scaffold_hash(ends,v,discarded,fragsize,radius=None):
+
+	h=hashlib.blake2b(repr((fitting,netsize,fragsize,radius,v,discarded)).encode(),digest_size=12)
+	h.update(array("q",ends).tobytes())
+	return h.hexdigest()
+
+
+#dividers is agp dividing coordinates - here we add the agp coord into our results key with scaff name, then add the closest tpf coord that meets our parameterised requirements
+#cache (--incremental) holds each scaffold's result from the last run, reused while its dividers and discards are unchanged.  reuse
+#(--dividers, from load_dividers) is {scaff:(hash,breakpoints)} from an earlier dividers.tsv, taken instead of searching wherever the
+#hash still matches.  sigs, if given, is filled with each scaffold's hash for write_dividers (not for scaffolds with missing breaks).
+#radii are the --adaptive per scaffold search radii, None for netsize texels
+def nearest(table,tpfdict,dividers,fragsize,discards,scafflen,tpfindex=None,cache=None,reuse=None,sigs=None,radii=None):
 	#waypoint
+	results={}
+	if tpfindex is None:
+		tpfindex=tpf_index(table,tpfdict)
+	closest={}
 	agptpfdiscrep=[]	#What remains in this list are elements in tpf that need breaking
 	for k,v in dividers.items():
-		for div in v:
-			if k+":"+str(div) not in closest:
-				##print(k, div, "not found!")
-				agptpfdiscrep.append(k+"\t"+str(div))
-				if k in discards:
-					for d in discards[k]:
-						if div+1 == int(d):
-							##print(k,div,"It's ok, this was discarded as fragment artefact")
-							agptpfdiscrep.remove(k+"\t"+str(div))
+		radius=None if radii is None else radii[k]
+		sig=(fitting,netsize,fragsize,radius,v,discards.get(k,[]))	#the settings too, as scaffold_hash has them, for caches kept across calls with different ones
+		h=scaffold_hash(tpfindex[k],v,sig[5],fragsize,radius) if reuse is not None or sigs is not None else None
+		if cache is not None and k in cache and cache[k][0]==sig:
+			scaffclosest,missing=cache[k][1:]
+		elif reuse is not None and k in reuse and reuse[k][0]==h:
+			scaffclosest,missing=reuse[k][1],[]
+		else:
+			scaffclosest,missing=scaffold_dividers(tpfindex,k,v,fragsize,discards,radii)
+			if cache is not None:
+				cache[k]=(sig,scaffclosest,missing)
+		if sigs is not None and not missing:
+			sigs[k]=h
+		closest.update(scaffclosest)
+		agptpfdiscrep.extend(missing)
+	if cache is not None:
+		for k in [k for k in cache if k not in dividers]:
+			del cache[k]
 	#[#print(x, y) for x, y in closest.items() if x.startswith('scaffold_1:')]
 	corrected = add_break(agptpfdiscrep, tpfdict) # Introduce breaks per item in agptpfdiscrep
 	[print(i, v) for i, v in closest.items() if i == 'scaffold_1:72267081']
@@ -408,6 +830,105 @@ def nearest(tpfdict,dividers,fragsize,discards,scafflen):
 	return results				
 
 
+#--breaks: exact break coordinates, one per line as dividers.tsv has them (scaffold, agp coordinate, tpf coordinate - the last bp
+#before the break) or just scaffold and bp.  Returns them keyed as nearest() returns its breakpoints
+def read_breaks(breaksfile):
+
+	breakpoint={}
+	bad=[]
+	name=breaksfile if isinstance(breaksfile,str) else "breaks"
+	with lines_in(breaksfile) as f:
+		for linenum,line in enumerate(f,1):
+			if line.startswith("#") or not line.strip():
+				continue
+			x=line.split()
+			if len(x)==2:
+				x=[x[0],x[1],x[1]]
+			if len(x)!=3 or not x[1].isdigit() or not x[2].isdigit():
+				bad.append(name+" line "+str(linenum)+":\t"+line.strip())
+				continue
+			breakpoint[x[0]+":"+x[1]]=int(x[2])
+	if bad:
+		for b in bad:
+			print(b)
+		print("\n\t\t>>> PLEASE FIX BREAKS FILE AND RERUN <<<\n")
+		raise CurationStop({"breaks_file":bad})
+
+	return breakpoint
+
+
+#Copy of a tpf table that rows can be added to without touching the one load_tpf() keeps
+def copy_table(table):
+
+	return {k:dict(v) if k=="ids" else v[:] for k,v in table.items()}
+
+
+#Splits the components exact breaks fall inside, so every break lands on a component end for breaktpf: scaffold_1:1-9000 broken at
+#5000 becomes scaffold_1:1-5000 and scaffold_1:5001-9000.  Each break is found by bisect in its scaffold's source map.  A break in a
+#gap moves back to the end of the component before it and one at or past the scaffold's last end is no break (as nearest() drops
+#them).  A dividers.tsv row add_break() made for a missing break has the agp coordinate + 1 as its tpf coordinate, never a component
+#end (nearest() only matches ends), so such a break is taken at the agp coordinate itself.  New rows are added to table; returns
+#tpfdict with the split scaffolds' row lists replaced, and the breakpoints to use
+def split_components(table,tpfdict,breakpoint):
+
+	bybase={}
+	for k,v in breakpoint.items():
+		append_dict(k.split(":")[0],(v,k),bybase)
+	missing=[b for b in bybase if b not in tpfdict]
+	if missing:
+		for b in missing:
+			print(b+" is in the breaks file but not in the tpf")
+		print("\n\t\t>>> PLEASE FIX BREAKS FILE AND RERUN <<<\n")
+		raise CurationStop({"breaks_not_in_tpf":missing})
+
+	names=table["names"]
+	scaffcol=table["scaff"]
+	start=table["start"]
+	end=table["end"]
+	strand=table["strand"]
+	namecol=table["name"]
+	acc=table["acc"]
+	smaps=source_maps(table,{b:tpfdict[b] for b in bybase})
+	newdict=dict(tpfdict)
+	exact={}
+	for b,v in bybase.items():
+		cmap=smaps[b]
+		rows=cmap["rows"]
+		if not rows:
+			continue
+		ends={end[row] for row in rows}
+		v=[(bp-1 if bp not in ends and bp==int(k.split(":")[1])+1 else bp,k) for bp,k in v]	#add_break() rows
+		cuts={}	#row -> break coordinates inside it
+		for (bp,k),hit in zip(v,map_to_source(cmap,[bp for bp,k in v])):
+			if bp>=end[rows[-1]]:
+				continue
+			if hit is None:	#in a gap, or before the first component
+				i=bisect_right(cmap["starts"],bp)-1
+				if i>=0:
+					exact[k]=end[rows[i]]
+				continue
+			row=rows[hit[0]]
+			exact[k]=bp
+			if bp!=end[row]:
+				cuts.setdefault(row,set()).add(bp)
+		if not cuts:
+			continue
+		newrows=[]
+		for row in tpfdict[b]:
+			if row not in cuts:
+				newrows.append(row)
+				continue
+			lo=start[row]
+			for bp in sorted(cuts[row]):
+				print("Splitting "+component(table,row)+" at "+str(bp))
+				newrows.append(add_row(table,names[scaffcol[row]],lo,bp,strand[row],names[namecol[row]],0,names[acc[row]]))
+				lo=bp+1
+			newrows.append(add_row(table,names[scaffcol[row]],lo,end[row],strand[row],names[namecol[row]],0,names[acc[row]]))
+		newdict[b]=newrows
+
+	return newdict,exact
+
+
 def add_break(to_break, tpfdict):
 	
 	corrected = {}
@@ -419,214 +940,204 @@ def add_break(to_break, tpfdict):
 
 	return corrected
 
-def lens(tpfdict):
+#cache (--incremental) holds each scaffold's chunks from the last run, reused while its breaks are unchanged
+def breaktpf(table,tpfdict,breakpoint,cache=None):
 
-	lens={}
-	for k,v in tpfdict.items():
-		for i in v:
-			##print(k,i)
-			if not "GAP" in i:
-				hi=int(i.split()[1].split("-")[1])
-				if k not in lens:
-					lens[k]=hi
-				elif hi > lens[k]:
-					lens[k]=hi
-
-	return lens
-
-
-def breaktpf(tpfdict,breakpoint):
-
-	unused=[]
-	breaknew={}
+	breaknew={}	#scaff - tpf coord:number of agp dividers that snapped to it
 	results={}
+	names=table["names"]
+	scaffcol=table["scaff"]
+	start=table["start"]
+	end=table["end"]
+	strand=table["strand"]
+	namecol=table["name"]
+	gap=table["gap"]
 	for k,v in breakpoint.items():
 		base=k.split(":")[0]
 		if base not in breaknew:
-			breaknew[base]=[v]
+			breaknew[base]={v:1}
 		else:
-			breaknew[base].append(v)
+			breaknew[base][v]=breaknew[base].get(v,0)+1
 
 	#for k,v in breaknew.items():
 		#for coord in v:
 			##print(k,coord)
 
-	for k,v in tpfdict.items():
-		for line in v:
-			if not "GAP" in line:
-				if line not in unused:
-					unused.append(line)
-
-
 	#Here we set up a dictionary of tpfchunks (all the places we can find to break the tpf from comparing to the agp chunks)
+	#Each scaffold's lines are walked once: a component joins the current chunk, then every break at its end coordinate
+	#starts a new chunk.  Gap lines follow the component before them unless it closed a chunk.
 	for tscaff,v in tpfdict.items():
-		iteration=1
-		for line in v:
-			##print(k,line.strip())
-			if not "GAP" in line:
-				pre=line.split()[1].split(":")[0]+"%"+str(iteration)
-				tmax=int(line.split()[1].split("-")[1])
-				if tscaff in breaknew:	#if scaff is broken
-					for bscaff, breaks in breaknew.items():
-						if tscaff==bscaff:
-							for coord in breaks:
-								##print(tscaff,coord,tmax)
-								if coord==tmax:
-									##print(tscaff,coord,tmax)
-									if pre not in results:
-										if line in unused:
-											results[pre]=[line]
-											unused.remove(line)
-										iteration+=1
-										pre=line.split()[1].split(":")[0]+"%"+str(iteration)	
-									else:
-										if line in unused:
-											results[pre].append(line)
-											unused.remove(line)
-										iteration+=1
-										pre=line.split()[1].split(":")[0]+"%"+str(iteration)
-							
-								else:
-									if pre not in results:
-										if line in unused:
-											results[pre]=[line]
-											unused.remove(line)
-									else:
-										if line not in results[pre]:
-											if line in unused:
-												results[pre].append(line)
-												unused.remove(line)
-										elif "GAP" in line:
-											results[pre].append(line)	
-			
-				else:	#if scaff not broken
-					iteration=1	#Capturing unbroken scaffolds
-					##print("a",line)
-					pre=line.split()[1].split(":")[0]+"%"+str(iteration)
-					if pre not in results:
-						results[pre]=[line]
-						unused.remove(line)
-					else:
-						results[pre].append(line)
-						unused.remove(line)
-			else:
-				if pre not in results:
-					if line in unused:
-						results[pre]=[line]
-						unused.remove(line)
-				else:
-					if line in unused:
-						results[pre].append(line)	#gap line
-						unused.remove(line)
-					elif "GAP" in line:
-						results[pre].append(line.strip())	
+		breaks=breaknew.get(tscaff,{})	#unbroken scaffolds stay as a single chunk
+		sig=sorted(breaks.items())
+		if cache is not None and tscaff in cache and cache[tscaff][0]==sig:
+			chunks=cache[tscaff][1]
+		else:
+			chunks={}
+			pre=""
+			iteration=1
+			for line in v:
+				if not gap[line]:
+					compscaff=names[scaffcol[line]]
+					pre=compscaff+"%"+str(iteration)
+					append_dict(pre,line,chunks)
+					if end[line] in breaks:
+						iteration+=breaks[end[line]]
+						pre=compscaff+"%"+str(iteration)
+				elif pre in chunks:
+					chunks[pre].append(line)	#gap line
+			if cache is not None:
+				cache[tscaff]=(sig,chunks)
+		for k,rows in chunks.items():
+			if k not in results:
+				results[k]=[]
+			results[k].extend(rows)	#copied, the trimming below mustn't reach the cache
 
 	for k,v in results.items():
-		if "GAP" in v[0]:
+		if gap[v[0]]:
 			del v[0]
-		if "GAP" in v[-1]:
+		if gap[v[-1]]:
 			del v[-1]
 
-	test=[]
+	test=set()
 
 	for k,v in results.items():
 		##print(k,v)
 		for line in v:
-			if not "GAP" in line:
-				if line not in test:
-					test.append(line)
+			if not gap[line]:
+				key=(scaffcol[line],start[line],end[line],namecol[line],strand[line])	#same fields as the tpf line text
+				if key not in test:
+					test.add(key)
 				else:
-					print("duplicate",line)
+					print("duplicate",tpf_line(table,line)+"\n")
 
-	return results	#scaffold_21%1 ['?\tscaffold_21:1-320171\tscaffold_21\tPLUS\n', 'GAP\tTYPE-2\t23\n', '?\tscaffold_21:320195-1446380\tscaffold_21\tPLUS\n']
+	return results	#scaffold_21%1 [0, 1, 2] - tpf table rows for '?\tscaffold_21:1-320171\tscaffold_21\tPLUS', 'GAP\tTYPE-2\t23', '?\tscaffold_21:320195-1446380\tscaffold_21\tPLUS'
 	
 	
-def outputlist(tpfchunks,agpdict,tagdict):
+#tpfchunks keyed by base scaffold, with each chunk's [lo, hi] bounds reduced to the 0.7 factor containment window outputlist
+#tests agp fragments against.  Sorted on the window start (spread is the widest back to front window, normally 0) so an agp
+#fragment only needs to look at the chunks starting inside it
+def chunk_index(table,tpfchunks):
+
+	start=table["start"]
+	end=table["end"]
+	factor=0.7
+	bybase={}
+	for order,(tchunk,tlines) in enumerate(tpfchunks.items()):
+		tbase=tchunk.split("%")[0]
+		tlo=start[tlines[0]]	#first line in the chunk
+		thi=end[tlines[-1]]	#last line in the chunk
+		tlen=round((thi-tlo)*factor,2)
+		adj=tlen*factor
+		adjtlo=round(tlo+adj,2)
+		adjthi=round(thi-adj,2)
+		append_dict(tbase,(adjtlo,adjthi,order,tchunk),bybase)
+
+	index={}
+	for k,v in bybase.items():
+		v.sort()
+		spread=0
+		for i in v:
+			if i[0]-i[1]>spread:
+				spread=i[0]-i[1]
+		index[k]=([i[0] for i in v],v,spread)
+
+	return index
+
+
+#Chunks of ascaff with adjtlo > alo and adjthi < ahi, in tpfchunks order
+def contained_chunks(chunkindex,ascaff,alo,ahi):
+
+	if ascaff not in chunkindex:
+		return []
+	los,chunks,spread=chunkindex[ascaff]
+	found=[]
+	for i in range(bisect_right(los,alo),len(los)):
+		adjtlo,adjthi,order,tchunk=chunks[i]
+		if adjtlo-spread > ahi+1:	#every chunk from here on ends past the agp fragment (1bp slack for float rounding)
+			break
+		if adjthi < ahi:
+			found.append((order,tchunk))
+
+	return [tchunk for order,tchunk in sorted(found)]
+
+
+#The tpf rows (or None for a join gap) and flips one agp superscaffold lays out, with its join count and tags
+def superscaffold_rows(chunkindex,tpfchunks,agk,v,tagdict):
+
+	entries=[]
+	joins=0
+	tagged=[]
+	for i in v:
+		##print("A",i)
+		ascaff=i[0]
+		ornt=i[3]
+		alo=int(i[1])
+		ahi=int(i[2])
+		tgdictk = i[0]+"/"+str(i[1])+"/"+str(i[2])
+		##print(scaff,ornt,alo,ahi,prefix)
+		for tchunk in contained_chunks(chunkindex,ascaff,alo,ahi):	#chunks of this scaffold whose 0.7 factor window sits inside the agp fragment
+			tlines=tpfchunks[tchunk]
+			t2akey=agk+":"+ornt+"#"+tchunk
+			if tgdictk in tagdict:
+				tagged.append((t2akey,tagdict[tgdictk][0]))	#attaching tags to the tpfchunk/agp unq key
+			##print(k,tchunk,adjtlo,adjthi,alo,ahi,tlo,thi,ornt)
+			if entries:
+				entries.append((None,False))	#before adding the next line, always add a gap
+				joins+=1		#count joins
+			##print(tchunk,tlines)
+			if ornt=="-":
+				entries.extend(complement_scaffold(tlines))	#complement those lines
+			else:
+				entries.extend((line,False) for line in tlines)
+
+	return entries,joins,tagged
+
+
+#The chunks an agp fragment of scaffold b can pick up, as (name, first row, last row, rows) - enough to tell if they changed since a cached run
+def chunk_signature(chunkindex,tpfchunks,b):
+
+	if b not in chunkindex:
+		return ()
+	return tuple((tchunk,tpfchunks[tchunk][0],tpfchunks[tchunk][-1],len(tpfchunks[tchunk])) for adjtlo,adjthi,order,tchunk in chunkindex[b][1])
+
+
+#cache (--incremental) holds each superscaffold's rows from the last run, reused while its agp lines, tags and the chunks it draws on are unchanged
+def outputlist(table,tpfchunks,agpdict,tagdict,chunkindex=None,cache=None):
 
 	#Setting up agp scaff to tpfchunk key (agp,orientation,tpfchunk)
 	#Scaffold_30:+:1#scaffold_32_ctg1%1
 	#Scaffold_30:+:2#scaffold_52_ctg1%1
 	#Scaffold_30:+:3#scaffold_51_ctg1%1
 
-	check=[]
 	joins=0
-
-	##for k,v in tpfchunks.items():
-		#if k not in check:
-			#vals=[k,v]
-			#check.append(vals)
-	##print(tagdict)
-
-
-	tmp=[]
+	gap=table["gap"]
+	if chunkindex is None:
+		chunkindex=chunk_index(table,tpfchunks)
 	results_new={}
 	outlines=[]
 	tagged={}
-	
-	iteration=1
-	
+	chunksigs={}
 
 	for agk,v in agpdict.items():
-		for i in v:
-			##print("A",i)
-			ascaff=i[0]
-			ornt=i[3]
-			alo=int(i[1])
-			ahi=int(i[2])
-			tgdictk = i[0]+"/"+str(i[1])+"/"+str(i[2])
-			tmp.append(ascaff)
-			agprefix=agk+":"+ornt+":"+ascaff+"%"+str(tmp.count(ascaff))
-			##print(scaff,ornt,alo,ahi,prefix)
-			for tchunk,tlines in  tpfchunks.items():
-				##print(tchunk,tlines)
-				##print(agprefix)
-				tbase=tchunk.split("%")[0]
-				tlo=int(tlines[0].split()[1].split(":")[1].split("-")[0])	#first line in the chunk
-				##print(tlines[-1])
-				thi=int(tlines[-1].split()[1].split(":")[1].split("-")[1])	#last line in the chunk
-				if tbase==ascaff:
-					##print(ascaff,ornt,alo,ahi,agprefix,tchunk,tlo,thi)
-					##print(tlines)
-					factor=0.7
-					tlen=round((thi-tlo)*factor,2)
-					adj=tlen*factor
-					adjtlo=round(tlo+adj,2)
-					adjthi=round(thi-adj,2)
-					##print(tchunk,adjtlo,adjthi,alo,ahi,tlo,thi)
-					##print(tlines)
-					if adjtlo > alo and adjthi < ahi:
-						t2akey=agk+":"+ornt+"#"+tchunk
-						if tgdictk in tagdict:
-							append_dict(t2akey,tagdict[tgdictk][0],tagged)	#attaching tags to the tpfchunk/agp unq key
-						##print(k,tchunk,adjtlo,adjthi,alo,ahi,tlo,thi,ornt)
-						if agk not in results_new:	#The first time we see this chromosome
-							##print(k,tchunk,adjtlo,adjthi,alo,ahi,tlo,thi,ornt)
-							if ornt=="-":
-								results_new[agk]=[]	#set an empty list to add to
-								for aaa in complement_scaffold(tlines):
-									results_new[agk].append(aaa)
-									
-								#results_new[agk].append(complement_scaffold(tlines))	#complement that line and add it as first line in that chr
-								
-							else:
-								results_new[agk]=[]	#set an empty list to add to
-								for aaa in tlines:
-									results_new[agk].append(aaa)	#don't complement that line but add it as the first line for that chr
-									
-						else:	
-							gap="GAP\tTYPE-2\t200"	#before adding the next line, always add a gap
-							results_new[agk].append(gap)
-							joins+=1		#count joins
-							##print(tchunk,tlines)
-							if ornt=="-":
-								for line in complement_scaffold(tlines):
-									results_new[agk].append(line)
-									
-									##print(k,tchunk,line.strip())
-
-							else:
-								for line in tlines:
-									results_new[agk].append(line)
+		if cache is not None:
+			for i in v:
+				if i[0] not in chunksigs:
+					chunksigs[i[0]]=chunk_signature(chunkindex,tpfchunks,i[0])
+			sig=(v,[tagdict.get(i[0]+"/"+str(i[1])+"/"+str(i[2])) for i in v],[chunksigs[i[0]] for i in v])
+		if cache is not None and agk in cache and cache[agk][0]==sig:
+			entries,agkjoins,agktagged=cache[agk][1:]
+		else:
+			entries,agkjoins,agktagged=superscaffold_rows(chunkindex,tpfchunks,agk,v,tagdict)
+			if cache is not None:
+				cache[agk]=(sig,entries,agkjoins,agktagged)
+		if entries:	#superscaffolds with no tpf chunk in them don't get a number
+			results_new[agk]=entries
+		joins+=agkjoins
+		for t2akey,tags in agktagged:
+			append_dict(t2akey,tags,tagged)
+	if cache is not None:
+		for k in [k for k in cache if k not in agpdict]:
+			del cache[k]
 
 	#for k,v in tpfchunks.items():
 		##print(k,v)
@@ -639,114 +1150,84 @@ def outputlist(tpfchunks,agpdict,tagdict):
 	for k,v in results_new.items():
 		iteration+=1
 		##print(k,v)
-		for line in v:
-			x=line.split()
-			if not "GAP" in line:
-				x[2]=prefix+str(iteration)
-				newline="\t".join(x)
+		for line,flip in v:
+			if line is None:
+				outlines.append("GAP\tTYPE-2\t200")	#join gap
+			elif not gap[line]:
+				newline=tpf_line(table,line,prefix+str(iteration),flip)
 					##print(newline)
 				outlines.append(newline)
 			else:
-				outlines.append(line)	#Putting original gaps back in
+				outlines.append(tpf_line(table,line))	#Putting original gaps back in
 
 	return outlines, joins, tagged			
 
 
 #Adds any tpf lines (eg shrapnel) missing from agp back in
-def reinstate_lines(tpfdict,outlines,checkin,checkout):
+def reinstate_lines(table,tpfdict,outlines,checkin,checkout):
 
-	tmp=[]
-	dups=[]
+	dups=set()
+	dupscaffs=set()
 	finaloutlines=[]
+	gap=table["gap"]
+	checkout=set(checkout)
+	compscaff={}	#component eg scaffold_22:1693718-3211153 - the tpf scaffold(s) it is listed under
+	for k,v in tpfdict.items():
+		for row in v:
+			if not gap[row]:
+				append_dict(component(table,row),k,compscaff)
+
+	shrap=set()
 	for i in checkin:	#i is eg scaffold_22:1693718-3211153 - checkin is all input regions
 		if i not in checkout:
-			for k,v in tpfdict.items():
-				for line in v:
-					if not "GAP" in line:
-						if i in line:
-							tmp.append(line.strip().split()[2])	#tmp == shrapnel
+			shrap.update(compscaff[i])	#shrap == scaffolds with components the agp didn't place
 
-						
-	shrap = sorted(list(set(sorted(tmp))))
-	shrapnums=[]	#Going to use this to sort the final output
-	for scaff in shrap:
-		num=int(scaff.split("_")[1])
-		if num not in shrapnums:
-			shrapnums.append(num)
-	sorted_shrapnums=sorted(shrapnums)
-	for num in sorted_shrapnums:
-		for scaff in shrap:
-			scfnum=int(scaff.split("_")[1])
-			if num==scfnum:
-				for i in tpfdict[scaff]:
-					region=i.strip().split()[1]
-					if region in checkout:
-						dups.append(region)	#Find duplicates we're going to be rarely adding back in
-					outlines.append(i.strip())	#Shrapnel is added back in after sorting it on scaffnum
-			
+	#Shrapnel is added back in after sorting it on scaffnum.  Components the agp has already placed are rare
+	#duplicates - they stay where the agp put them and aren't added back in
+	for scaff in sorted(shrap,key=lambda scaff:(int(scaff.split("_")[1]),scaff)):
+		for row in tpfdict[scaff]:
+			if not gap[row]:
+				region=component(table,row)
+				if region in checkout:
+					dups.add(region)
+					dupscaffs.add(scaff)
+					continue
+			outlines.append(tpf_line(table,row))
 
-	for scaff in shrap:
-		for i in tpfdict[scaff]:
-			for d in dups:
-				if d in i:
-					for o in outlines:
-						if i.strip() in o:
-							outlines.remove(i.strip())	#Ensure these rare duplicates are removed
-	
 
 	final={}	#Build a new dict with sole purpose of removing trailing gap lines left over from removal of rare shrap duplicates
-	prev=""
+	scaff=""
 	for line in outlines:
-		x=line.strip().split()
+		x=line.split()
 		if not "GAP" in line:
 			scaff=x[2]
-			append_dict(scaff,line,final)
-			prev=scaff
-		else:
-			append_dict(scaff,line,final)
-	
+		append_dict(scaff,line,final)
+
 	for k,v in final.items():	#After we've removed duplicate shraps, we have trailing gaps to remove
 		while "GAP" in v[-1]:
 			del v[-1]
 		while "GAP" in v[0]:
-			del v[0]	
+			del v[0]
 		for line in v:
 			x=line.split()
-			scaff=x[2]
-			for d in dups:
-				if scaff in d:
-					x[2]=scaff+"_1"	#Add a suffix to say the scaffold has changed from the original scaffold
+			if not "GAP" in line and x[2] in dupscaffs:
+				x[2]=x[2]+"_1"	#Add a suffix to say the scaffold has changed from the original scaffold
 			newline="\t".join(x)
 			finaloutlines.append(newline)
-			
+
 	#So far this hasn't happened, but it's conceivable that shrapnel dups could be removed from start and end of a scaffold, leaving them reinstated with multiple gaps inbetween
 	#The below 50 or so lines of code inserted to hopefully deal with this, although no test case has yet come up.  Program runs fine
 	#with or without this code.  For all test-cases so far, the below code is not called.  However it should work if this rare
 	#situation ever crops up
 
-	gaps=[]
-	prevscaff=""
-	table={}
-	keystoupdate=[]
-	iteration=1
 	inter={}
 	linenumber=1
 	for line in finaloutlines:
 		x=line.strip().split()
 		if not "GAP" in line:
 			scaff=x[2]
-			gaps=[]
 			append_dict(scaff,linenumber,inter)
-			linenumber+=1
-			
-		else:
-			gaps.append(x)
-			linenumber+=1
-			if len(gaps)>1:
-				if scaff not in keystoupdate:
-					keystoupdate.append(scaff)
-					
-	#keystoupdate are all scaffs that contain consecutive gap lines - places where broken scaffs have been reinstated incorrectly
+		linenumber+=1
 
 	new={}
 	for k,v in inter.items():
@@ -762,14 +1243,13 @@ def reinstate_lines(tpfdict,outlines,checkin,checkout):
 		for e, i in enumerate(v):
 			if i >2:		#These are consecutive gap lines we are trying to catch - ie distance between non-gap lines is greater than 2
 				if k not in breakers:
-					breakers[k]=[inter[k][e]]
+					breakers[k]={inter[k][e]}
 				else:
-					breakers[k].append(inter[k][e])
+					breakers[k].add(inter[k][e])
 			
 	iteration=1
-	newkeys=[]
-	linenumber=0	
-	lastline=[]
+	linenumber=0
+	lastline=""
 	finalfinal=[]	
 	for line in finaloutlines:
 		linenumber+=1
@@ -784,49 +1264,44 @@ def reinstate_lines(tpfdict,outlines,checkin,checkout):
 					x[2]=newscaff
 					newline="\t".join(x)
 					finalfinal.append(newline)
-					lastline.append(line.strip())
+					lastline=line.strip()
 				else:
 					x[2]=newscaff
 					newline="\t".join(x)
 					finalfinal.append(newline)
-					lastline.append(line.strip())
+					lastline=line.strip()
 			else:
 				finalfinal.append(line.strip())
-				lastline.append(line.strip())
-		elif not "GAP" in lastline[-1]:			#We don't want to output multiple gaps - just take one
+				lastline=line.strip()
+		elif not "GAP" in lastline:			#We don't want to output multiple gaps - just take one
 			finalfinal.append(line.strip())
-			lastline.append(line.strip())
+			lastline=line.strip()
 
 	return finalfinal
 
 
 def write_output_tpf(outlinesfull,outfile):
  
-	with open(outfile,'w') as fout:
+	with atomic_write(outfile) as fout:
 		for k,v in outlinesfull.items():
 			for line in v:
 				fout.write(line+"\n")
 
 
-def compare_scaff(tpfdict,agp):
+def compare_scaff(tpfdict,agprecords):
 
 	scaffs=[]
 	probs=[]
-	with open(agp, 'r') as f:
-		for line in f:
-			if line[0] != "#" and line !="\n":
-				x=line.strip().split()
-				scaff=x[5]
-				entry=x[4]
-				if entry != "U":	#is not a gap
-					scaffs.append(scaff)
+	for r in agprecords:
+		if r.type != "U":	#is not a gap
+			scaffs.append(r.scaff)
 
 	for s in scaffs:
 		if s not in tpfdict:
 			probs.append(s)
 	if len(probs) > 0:
 		#print("\nagp and tpf not in sync, ",probs[0],"not in tpf for example\n")
-		sys.exit()
+		raise CurationStop({"agp_not_in_tpf":probs})
 		
 
 def commas(number):
@@ -842,31 +1317,14 @@ def commas(number):
 	return "".join(n)
 	
 	
-def contig_lens(tpfdict):
-
-	ctg_lengths={}
-	for k,v in tpfdict.items():
-		for i in v:
-			if not "GAP" in i:
-				x=i.strip().split()
-				hi=int(x[1].split(":")[1].split("-")[1])
-				lo=int(x[1].split(":")[1].split("-")[0])
-				length=hi-lo
-				append_dict(k,length,ctg_lengths)
-	return ctg_lengths
-	
 def report_agp_discards(discards,agplines):
 	print(f'HERE {discards}')
 	for k,v in agplines.items():
-		for line in v:
-			i=line.strip().split()
-			scaff=i[5]
-			coord=i[6]
-			if scaff in discards:
-				##print(scaff,coord)
-				##print(type(discards[scaff][0]),type(coord))
-				if discards[scaff][0]==int(coord):
-					print(line.strip())
+		for r in v:
+			if r.scaff in discards:
+				##print(r.scaff,r.start)
+				if discards[r.scaff][0]==r.start:
+					print(r.line.strip())
 
 
 def report_discreps(discards,agpdict,tpfchunks,outlinesfull):
@@ -977,10 +1435,10 @@ def report_stats(agpdict,outlinesfull,breakpoint,gsize,gsize2,texel,tpfout,tpf,d
 
 
 #We can use this file to see where rapid_pretext wants to break the genome based on the AGP.  This is useful should we need to switch to the XL version of the script		
-def write_dividers(dividers):
+#sigs (scaffold hashes from nearest) go to sigfile, for --dividers to reuse the breakpoints on a later run
+def write_dividers(dividers,outfile="dividers.tsv",sigs=None,sigfile=None):
 
-	outfile="dividers.tsv"
-	with open(outfile,'w') as fout:
+	with atomic_write(outfile) as fout:
 		fout.write("#scaffold\tAGP\tTPF\n")
 		for k,v in dividers.items():
 			scaff=k.split(":")[0]
@@ -989,6 +1447,39 @@ def write_dividers(dividers):
 			new=[scaff,agp,tpf]
 			a="\t".join(new)
 			fout.write(a+"\n")
+	if sigs is not None and sigfile:
+		with atomic_write(sigfile) as fout:
+			fout.write("#scaffold\thash\n")
+			for k,h in sigs.items():
+				fout.write(k+"\t"+h+"\n")
+
+
+#sig file beside a dividers.tsv
+def sig_path(dividersfile):
+
+	return dividersfile+".sig"
+
+
+#--dividers: the breakpoints of an earlier dividers.tsv, grouped by scaffold with the hash each was found under ({scaff:(hash,breakpoints)}).
+#Only scaffolds in its sig file are reusable - without one (eg a dividers.tsv from an older run) everything is searched for again
+def load_dividers(dividersfile):
+
+	hashes={}
+	try:
+		with open(sig_path(dividersfile)) as f:
+			for line in f:
+				if not line.startswith("#") and line.strip():
+					x=line.split()
+					hashes[x[0]]=x[1]
+	except OSError:
+		print("No "+sig_path(dividersfile)+", so no breakpoints can be reused from "+dividersfile,file=sys.stderr)
+	reuse={k:(h,{}) for k,h in hashes.items()}
+	for k,v in read_breaks(dividersfile).items():
+		scaff=k.split(":")[0]
+		if scaff in reuse:
+			reuse[scaff][1][k]=v
+
+	return reuse
 
 
 def tag_tpfchunks(tagdict,outlinesfull,tpfchunks):	
@@ -1018,12 +1509,15 @@ def tag_tpfchunks(tagdict,outlinesfull,tpfchunks):
 		
 	
 #get haplines and removes them from output	
-def get_haps(tpfchunktags,tpfchunks,output):
+def get_haps(table,tpfchunktags,tpfchunks,output):
 
 	scaff_dict={}
 	hapcomponents=[]
 	haptpfchunklens={}
 	final={}
+	start=table["start"]
+	end=table["end"]
+	gap=table["gap"]
 	
 	##print(tpfchunktags)
 	for k,v in tpfchunktags.items():
@@ -1033,20 +1527,17 @@ def get_haps(tpfchunktags,tpfchunks,output):
 			if "HAPLOTIG" in tag:
 				##print(k,tag)
 				total=0
-				for line in tpfchunks[k]:
-					if not "GAP" in line:
-						##print(line)
-						lo=int(line.split(":")[1].split("-")[0].split("\t")[0])
-						hi=int(line.split(":")[1].split("-")[1].split("\t")[0])
-						length=(hi-lo)+1
+				for row in tpfchunks[k]:
+					if not gap[row]:
+						length=(end[row]-start[row])+1
 						total+=length
 
 				haptpfchunklens[k]=total
 				
 	for k in haptpfchunklens.keys():
-		for line in tpfchunks[k]:
-			if not "GAP" in line:
-				comp=line.split()[1]
+		for row in tpfchunks[k]:
+			if not gap[row]:
+				comp=component(table,row)
 				hapcomponents.append(comp)
 
 	prev=""
@@ -1082,23 +1573,24 @@ def get_haps(tpfchunktags,tpfchunks,output):
 	return final, haptpfchunklens
 
 
-def get_unlocs(tpfchunktags,tpfchunks,haplessoutput,haptpfchunklens, sex_chrms,tagged):
+def get_unlocs(table,tpfchunktags,tpfchunks,haplessoutput,haptpfchunklens, sex_chrms,tagged):
 
 	scaff_dict={}
 	unloctpfchunklens={}
 	chrms_containing_unlocs=[]
 	check={}
+	start=table["start"]
+	end=table["end"]
+	gap=table["gap"]
 	
 	for k,v in tpfchunktags.items():
 		##print(k,v)
 		total=0
 		for tag in v[0]:
 			if "UNLOC" in tag:
-				for line in tpfchunks[k]:
-					if not "GAP" in line:
-						lo=int(line.split(":")[1].split("-")[0].split("\t")[0])
-						hi=int(line.split(":")[1].split("-")[1].split("\t")[0])
-						length=(hi-lo)+1
+				for row in tpfchunks[k]:
+					if not gap[row]:
+						length=(end[row]-start[row])+1
 						total+=length
 				unloctpfchunklens[k]=total
 
@@ -1177,34 +1669,38 @@ def name_unlocs(unloctpfchunklens,tpfchunktags,sex_chrms,tagged):
 	return named_unlocs
 
 
-def prepare_haps_tpf(named_haps, tpfchunks):
+def prepare_haps_tpf(table,named_haps, tpfchunks):
 
 	outlines={}
 
 	for k,v in named_haps.items():
-		for line in tpfchunks[k]:
-			if not "GAP" in line:
-				x=line.strip().split()
-				x[2]=v
-				newline="\t".join(x)
-				append_dict(v,newline,outlines)
+		for row in tpfchunks[k]:
+			if not table["gap"][row]:
+				append_dict(v,tpf_line(table,row,v),outlines)
 			else:
-				append_dict(v,line.strip(),outlines)
-			
+				append_dict(v,tpf_line(table,row),outlines)
+
 	return outlines
 
 			
+#haps_ file name beside the main output tpf
+def hap_path(tpfout):
+
+	head,tail=os.path.split(tpfout)
+	return os.path.join(head,"haps_"+tail)
+
+
 def write_hap_tpf(hapoutlines,tpfout):
 
-	haptpf="haps_"+tpfout
-	with open(haptpf,'w') as fout:
+	haptpf=hap_path(tpfout)
+	with atomic_write(haptpf) as fout:
 		for k,v in hapoutlines.items():
 			for line in v:
 				fout.write(line+"\n")
 				
 
 #Ensuring that all members of a chr are labelled with the sex even if all members not labelled in AGP				
-def sex_components(tpfchunks,tpfchunktags,tagged,sex_chrms):
+def sex_components(table,tpfchunks,tpfchunktags,tagged,sex_chrms):
 
 	comp_sex={}
 
@@ -1213,9 +1709,9 @@ def sex_components(tpfchunks,tpfchunktags,tagged,sex_chrms):
 		tpc=k.split("#")[1]
 		for a,b in sex_chrms.items():
 			if chrm==b[0]:
-				for line in tpfchunks[tpc]:
-					if not "GAP" in line:
-						comp=line.split()[1]
+				for row in tpfchunks[tpc]:
+					if not table["gap"][row]:
+						comp=component(table,row)
 						comp_sex[comp]=a
 								
 	return comp_sex
@@ -1245,16 +1741,17 @@ def apply_sex(hapoutlines,comp_sex,sex_chrms):
 
 
 #all the components that belong to unloc scaffolds 	
-def get_unloc_comps(named_unlocs,tpfchunks):
+def get_unloc_comps(table,named_unlocs,tpfchunks):
 
 	results={}
 	for k,v in named_unlocs.items():
 		##print(tpfchunks[k],v)
-		for line in tpfchunks[k]:
-			comp=line.split()[1]
-			append_dict(comp,v,results)
-			
-			
+		for row in tpfchunks[k]:
+			if not table["gap"][row]:	#only components are looked up
+				comp=component(table,row)
+				append_dict(comp,v,results)
+
+
 	return results
 
 
@@ -1382,17 +1879,17 @@ def parse_errors():
 				for i in v:
 					print(i)
 				print("\n\t\t>>> PLEASE FIX AGP TAGS AND RERUN <<<\n")
-				sys.exit()
+				raise CurationStop(dict(errors))
 			if k=="multiple_sex":
 				for i in v:
 					print(i)
 				print("\n\t\t>>> PLEASE FIX AGP TAGS AND RERUN <<<\n")
-				sys.exit()
+				raise CurationStop(dict(errors))
 			if k=="multiple_sex2":
 				for i in v:
 					print(i)
 				print("\n\t\t>>> PLEASE FIX AGP TAGS AND RERUN <<<\n")
-				sys.exit()
+				raise CurationStop(dict(errors))
 			if k=="internal_unloc":
 				#print("\nUnloc scaffs are internal to painted chromosomes.  Please move and rerun\n")
 				for i in v:
@@ -1401,33 +1898,33 @@ def parse_errors():
 					else:
 						print(i[0],i[1][0]+" to "+i[1][1])
 				#print("\n\t\t>>> PLEASE FIX AGP TAGS AND RERUN <<<\n")
-				sys.exit()	
+				raise CurationStop(dict(errors))	
 			if k=="hetero_sex_haplo":
 				#print("Doesn't make sense - haplotig painted into heterogametic sex chromosome:\n")
 				for i in v:
 					print(i[0])
 				print("\n\t\t>>> PLEASE FIX AGP TAGS AND RERUN <<<\n")
-				sys.exit()
+				raise CurationStop(dict(errors))
 			if k=="xssex":
 				for i in v:
 					print(i)
 				print("\n\t\t>>> PLEASE FIX AGP TAGS AND RERUN <<<\n")
-				sys.exit()	
+				raise CurationStop(dict(errors))	
 			if k=="badsex":
 				for i in v:
 					print(i)
 				print("\n\t\t>>> PLEASE FIX AGP TAGS AND RERUN <<<\n")	
-				sys.exit()				
+				raise CurationStop(dict(errors))				
 			else:
 				if len(v)>1:
 					for i in v:
 						print(i)
 					print("\n\t\t>>> PLEASE FIX BREAKS FILE AND RERUN <<<\n")
-					sys.exit()	###IMPORTANT - turn this back on once program is written	
+					raise CurationStop(dict(errors))	###IMPORTANT - turn this back on once program is written	
 				else:
 					print(v[0])
 					print("\n\t\t>>> PLEASE FIX BREAKS FILE AND RERUN <<<\n")
-					sys.exit()	###IMPORTANT - turn this back on once program is written
+					raise CurationStop(dict(errors))	###IMPORTANT - turn this back on once program is written
 
 
 def check_componentsH(finalout2,hapoutlines,checkin):
@@ -1457,62 +1954,117 @@ def check_componentsH(finalout2,hapoutlines,checkin):
 			print(f)
 
 
-def main():
+#Number of rows in a {key: [rows]} dict
+def rowcount(d):
 
-	parser = argparse.ArgumentParser(description='Designed to take pretext generated AGP and fit your assembly TPF to it.') 
+	return sum(len(v) for v in d.values())
 
-	#positional args
-	parser.add_argument('tpf', metavar='tpf', type=str, help='assembly TPF with gaps as needed to allow rearrangement to match the edited PretextView map.')
-	parser.add_argument('agp', metavar='agp', type=str, help='Pretext agp')
-	#parser.add_argument('breaks', metavar='breaks', type=str, help='breaks file')
-	#parser.add_argument('fasta', metavar='fasta', type=str, help='original assembly fasta')
 
-	#display help when misusage
-	if len(sys.argv) <2: 
-		parser.print_help()
+#Process peak RSS so far in Mb (ru_maxrss is in kb on Linux, bytes on macOS)
+def peak_rss():
 
-	args = parser.parse_args()  #gets the arguments
-	start_time = datetime.now()
+	if resource is None:
+		return None
+	rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform=="darwin":
+		rss//=1024
+	return round(rss/1024,1)
 
-	#print("\n")
 
-	#print("\nChecking "+args.tpf+" sanity...\n\n")
-	tpf_sanity(args.tpf)
+#Runs one pipeline stage, recording wall/cpu time, peak RSS and (via items) a count of what it produced when profiling.  A plain call otherwise
+def staged(name,items,func,*args):
 
+	if profile is None:
+		return func(*args)
+	wall=time.perf_counter()
+	cpu=time.process_time()
+	result=func(*args)
+	record={"stage":name,"wall_s":round(time.perf_counter()-wall,6),"cpu_s":round(time.process_time()-cpu,6),"peak_rss_mb":peak_rss()}
+	if items is not None:
+		record["items"]=items(result)
+	profile.append(record)
+	return result
+
+
+def write_profile(outfile,tpf,agp,wall,cpu):
+
+	with atomic_write(outfile) as fout:
+		json.dump({"tpf":tpf,"agp":agp,"wall_s":round(wall,6),"cpu_s":round(cpu,6),"peak_rss_mb":peak_rss(),"stages":profile},fout,indent=1)
+		fout.write("\n")
 
-	tpfdict, errors2=parse_tpf(args.tpf)
-	
-	compare_scaff(tpfdict,args.agp)
 
-	ctg_lengths=contig_lens(tpfdict)
-	gsize,texel=genome_size(tpfdict)
-	scafflens=lens(tpfdict)
+#Everything taken from the tpf alone - parsed, checked and indexed once, and kept resident between agps by --watch.  tpf is a path, or
+#lines with name used for it in the report
+def load_tpf(tpf,name=None):
+
+	name=tpf if name is None else name
+	#print("\nChecking "+tpf+" sanity...\n\n")
+	table, tpfdict, errors2=staged("parse_tpf",lambda r: len(r[0]["scaff"]),parse_tpf,tpf)
+	report_sanity(name,staged("validate_tpf",rowcount,validate_tpf,table,tpfdict))
+
+	stats=staged("assembly_stats",lambda r: len(r["scafflens"]),assembly_stats,table,tpfdict)
+	tpfindex=staged("tpf_index",rowcount,tpf_index,table,tpfdict)
 	#for k,v in scafflens.items():
 		##print(k,v)
+	checkin=staged("components_from_dict",len,components_from_dict,table,tpfdict)
+
+	return {"tpf":name,"table":table,"tpfdict":tpfdict,"errors2":errors2,"stats":stats,"tpfindex":tpfindex,"checkin":checkin}
+
+
+#One agp (a path or its lines) against a tpf from load_tpf(), writing outputs (file name -> path), or nothing when outputs is None.  caches
+#are the nearest/breaktpf/outputlist caches, or None each for a full run.  breaks (from read_breaks) are exact break coordinates - the
+#XL mode: every agp fragment is kept, nearest() is skipped and components are split where the breaks say.  reuse (from load_dividers)
+#are an earlier run's breakpoints, used for the scaffolds whose hash is unchanged.  Returns what was worked out, keyed as the output files are
+def run_agp(tpfdata,agp,outputs,caches,breaks=None,reuse=None):
+
+	errors.clear()	#run_agp is called once per agp by --watch
+	table=tpfdata["table"]
+	tpfdict=tpfdata["tpfdict"]
+	stats=tpfdata["stats"]
+	gsize=stats["gsize"]
+	texel=stats["texel"]
+	scafflens=stats["scafflens"]
+	tpfindex=tpfdata["tpfindex"]
+	checkin=tpfdata["checkin"]
+
+	agprecords,resolution=staged("parse_agp",lambda r: len(r[0]),parse_agp,agp)
+	staged("compare_scaff",None,compare_scaff,tpfdict,agprecords)
+
 	fragcutoff=1*texel
-	agpdict,discards,agplines, tagdict, sex_chrms = scaffs_from_agp(args.agp,fragcutoff,scafflens,ctg_lengths,texel)	#All the agp order and orientation information
+	minctg=stats["minctg"] if breaks is None else None	#exact breaks leave no snap-mode artefacts to filter out
+	agpdict,discards,agplines, tagdict, sex_chrms = staged("scaffs_from_agp",lambda r: rowcount(r[2]),scaffs_from_agp,agprecords,fragcutoff,minctg,texel)	#All the agp order and orientation information
 	#print(agpdict)
 	#for k,v in agplines.items():
 	#	#print(k,v)
 	
 	##print(tagdict)
 
-	report_errors(errors2)
-	checkin=components_from_dict(tpfdict)
+	report_errors(tpfdata["errors2"])
 
-	dividers=agp_dividers(agpdict)
-	
-	#for k,v in dividers.items():
-		##print(k,v)
-	
-	breakpoint=nearest(tpfdict,dividers,fragcutoff,discards,scafflens)
-	#print(breakpoint)
+	if breaks is None:
+		dividers=staged("agp_dividers",rowcount,agp_dividers,agpdict)
+		
+		#for k,v in dividers.items():
+			##print(k,v)
+		
+		sigs={}
+		radii=staged("search_radii",len,search_radii,table,tpfdict,texel,resolution) if adaptive else None
+		breakpoint=staged("nearest",len,nearest,table,tpfdict,dividers,fragcutoff,discards,scafflens,tpfindex,caches["nearest"],reuse,sigs,radii)
+		#print(breakpoint)
+		if reuse is not None:
+			print("Dividers: reused "+str(sum(1 for k,v in reuse.items() if k in sigs and sigs[k]==v[0]))+"/"+str(len(dividers))+" scaffolds",file=sys.stderr)
+	else:
+		caches={"nearest":None,"breaktpf":None,"outputlist":None}	#split rows are new every run
+		table=copy_table(table)
+		tpfdict,breakpoint=staged("split_components",lambda r: len(r[1]),split_components,table,tpfdict,breaks)
+		checkin=staged("components_from_dict",len,components_from_dict,table,tpfdict)
 
-	write_dividers(breakpoint)	#Produce output which we can parse to create input for the XL versin of the script (if a curator runs this version of the script instead of the XL version by mistake).
+	if outputs is not None:
+		staged("write_dividers",None,write_dividers,breakpoint,outputs["dividers.tsv"],sigs if breaks is None else {},outputs.get("dividers.tsv.sig"))	#Produce output which we can parse to create input for the XL versin of the script (if a curator runs this version of the script instead of the XL version by mistake).
 
-	tpfchunks=breaktpf(tpfdict,breakpoint)
+	tpfchunks=staged("breaktpf",len,breaktpf,table,tpfdict,breakpoint,caches["breaktpf"])
 
-	outlines,joins, tagged = outputlist(tpfchunks,agpdict,tagdict) #joins is join count
+	outlines,joins, tagged = staged("outputlist",lambda r: len(r[0]),outputlist,table,tpfchunks,agpdict,tagdict,None,caches["outputlist"]) #joins is join count
 
 	#tagged eg:
 	#{'Scaffold_1:-#scaffold_141%1': [['Z', 'UNLOC']], 'Scaffold_1:-#scaffold_32%1': [['Z']], 'Scaffold_9:-#scaffold_68%1': [['HAPLOTIG']], 'Scaffold_9:-#scaffold_81%1': [['UNLOC']], 'Scaffold_9:+#scaffold_8%1': [['UNLOC']], 'Scaffold_12:+#scaffold_15%1': [['W']]}
@@ -1521,55 +2073,256 @@ def main():
 	#for l in outlines:
 	#	#print(l)
 
-	checkout=check_components(outlines)
-	outlinesfull=reinstate_lines(tpfdict,outlines,checkin,checkout)
+	checkout=staged("check_components",len,check_components,outlines)
+	outlinesfull=staged("reinstate_lines",len,reinstate_lines,table,tpfdict,outlines,checkin,checkout)
 
 
-	tpfchunktags = tag_tpfchunks(tagged,outlinesfull,tpfchunks)
+	tpfchunktags = staged("tag_tpfchunks",len,tag_tpfchunks,tagged,outlinesfull,tpfchunks)
 	##print(tpfchunktags)
 
-	haplessoutput, haptpfchunklens = get_haps(tpfchunktags,tpfchunks,outlines)
+	haplessoutput, haptpfchunklens = staged("get_haps",lambda r: len(r[1]),get_haps,table,tpfchunktags,tpfchunks,outlines)
 
-	named_unlocs = get_unlocs(tpfchunktags,tpfchunks,haplessoutput,haptpfchunklens, sex_chrms,tagged)
+	named_unlocs = staged("get_unlocs",len,get_unlocs,table,tpfchunktags,tpfchunks,haplessoutput,haptpfchunklens, sex_chrms,tagged)
 	##print(named_unlocs)
-	unloc_comps = get_unloc_comps(named_unlocs,tpfchunks)
-	unlochaplessoutput = update_output_unlocs(unloc_comps, haplessoutput, sex_chrms)
+	unloc_comps = staged("get_unloc_comps",len,get_unloc_comps,table,named_unlocs,tpfchunks)
+	unlochaplessoutput = staged("update_output_unlocs",rowcount,update_output_unlocs,unloc_comps, haplessoutput, sex_chrms)
 
-	named_haps = name_haps(haptpfchunklens)
-	hapoutlines = prepare_haps_tpf(named_haps, tpfchunks)
+	named_haps = staged("name_haps",len,name_haps,haptpfchunklens)
+	hapoutlines = staged("prepare_haps_tpf",rowcount,prepare_haps_tpf,table,named_haps, tpfchunks)
 	
-	comp_sex = sex_components(tpfchunks,tpfchunktags,tagged, sex_chrms)
+	comp_sex = staged("sex_components",len,sex_components,table,tpfchunks,tpfchunktags,tagged, sex_chrms)
 	
-	sexedunlochaplessoutput = apply_sex(unlochaplessoutput,comp_sex, sex_chrms)
+	sexedunlochaplessoutput = staged("apply_sex",rowcount,apply_sex,unlochaplessoutput,comp_sex, sex_chrms)
 	
-	finalout1 = update_chr_keys(sexedunlochaplessoutput)
+	finalout1 = staged("update_chr_keys",rowcount,update_chr_keys,sexedunlochaplessoutput)
 	
-	finalout2 = remove_excess_gaps(finalout1)
+	finalout2 = staged("remove_excess_gaps",rowcount,remove_excess_gaps,finalout1)
 	
 	##print(errors)
-	parse_errors()
+	staged("parse_errors",None,parse_errors)
 	
-	gsize2=genome_size2(outlinesfull)
+	gsize2=staged("genome_size2",None,genome_size2,outlinesfull)
 		
-	tpfout="rapid_prtxt.tpf"
-
-	write_output_tpf(finalout2,tpfout)
-	#if len(hapoutlines)>0:
-	write_hap_tpf(hapoutlines,tpfout)
+	if outputs is not None:
+		tpfout=outputs["rapid_prtxt.tpf"]
+		staged("write_output_tpf",None,write_output_tpf,finalout2,tpfout)
+		#if len(hapoutlines)>0:
+		staged("write_hap_tpf",None,write_hap_tpf,hapoutlines,tpfout)
+	else:
+		tpfout="rapid_prtxt.tpf"
 	
-	check_componentsH(finalout2,hapoutlines,checkin)	#Belt and braces checking again that final naming based on tags hasn't lost any components	
+	staged("check_componentsH",None,check_componentsH,finalout2,hapoutlines,checkin)	#Belt and braces checking again that final naming based on tags hasn't lost any components	
 	
-	report_stats(agpdict,outlinesfull,breakpoint,gsize,gsize2,texel,tpfout,args.tpf,discards,agplines,joins,named_haps,sex_chrms)
+	staged("report_stats",None,report_stats,agpdict,outlinesfull,breakpoint,gsize,gsize2,texel,tpfout,tpfdata["tpf"],discards,agplines,joins,named_haps,sex_chrms)
 	
-	report_discreps(discards,agpdict,tpfchunks,outlinesfull)
+	staged("report_discreps",None,report_discreps,discards,agpdict,tpfchunks,outlinesfull)
 
 	#print("\nChecking "+tpfout+" sanity...\n")
 	
-	tpf_sanity(tpfout)
-	
+	if outputs is not None:
+		problems=staged("tpf_sanity",None,tpf_sanity,tpfout)
+	else:
+		problems=staged("tpf_sanity",None,tpf_sanity,tpfout,[line for v in finalout2.values() for line in v])
+
+
 	#print("Written:\n")
 	#print(location(tpfout))
-	#print(location("haps_"+tpfout))
+	#print(location(hap_path(tpfout)))
+
+	return {"dividers.tsv":breakpoint,"rapid_prtxt.tpf":finalout2,"haps_rapid_prtxt.tpf":hapoutlines,"sanity":problems,"joins":joins,"named_haps":named_haps}
+
+
+#AGP stem (name less .pretext.agp) -> output paths, so each watched agp writes its own set
+def stem_outputs(out,stem):
+
+	tpfout=out(stem+".rapid_prtxt.tpf")
+	return {"dividers.tsv":out(stem+".dividers.tsv"),"dividers.tsv.sig":sig_path(out(stem+".dividers.tsv")),"rapid_prtxt.tpf":tpfout,"haps_rapid_prtxt.tpf":hap_path(tpfout)}
+
+
+#--watch: with the tpf loaded once, rebuild the outputs for every *.pretext.agp that appears or changes in watchdir until interrupted.
+#A file is only read once its mtime and size have held for one poll, so a half saved agp is never picked up.  Each agp keeps its own
+#nearest/breaktpf/outputlist caches in memory, so a small edit only recomputes what it touched
+def watch(tpfdata,watchdir,agp,out,interval):
+
+	suffix=".pretext.agp"
+	caches={}
+	built={}	#path -> (mtime, size) last built
+	pending={}	#path -> (mtime, size) seen on the previous poll
+
+	def build(path):
+		stem=os.path.basename(path)
+		stem=stem[:-len(suffix)] if stem.endswith(suffix) else os.path.splitext(stem)[0]
+		outputs=stem_outputs(out,stem)
+		t0=time.perf_counter()
+		try:
+			run_agp(tpfdata,path,outputs,caches.setdefault(stem,{"nearest":{},"breaktpf":{},"outputlist":{}}))
+			status="written "+outputs["rapid_prtxt.tpf"]
+		except SystemExit:	#agp errors already reported - wait for the next save
+			status="stopped, fix the agp and save again"
+		except Exception as e:
+			status="failed: "+type(e).__name__+": "+str(e)
+		print(path+": "+status+" ("+str(round((time.perf_counter()-t0)*1000))+" ms)",file=sys.stderr)
+		sys.stdout.flush()
+
+	for entry in os.scandir(watchdir):	#agps already there are left alone unless they change
+		if entry.name.endswith(suffix) and entry.is_file():
+			try:
+				st=entry.stat()
+			except OSError:	#deleted or renamed since the scandir
+				continue
+			built[entry.path]=(st.st_mtime_ns,st.st_size)
+	if agp:
+		build(agp)
+	print("Watching "+watchdir+" for *"+suffix+" (Ctrl-C to stop)",file=sys.stderr)
+	try:
+		while True:
+			for entry in os.scandir(watchdir):
+				if not entry.name.endswith(suffix) or not entry.is_file():
+					continue
+				try:
+					st=entry.stat()
+				except OSError:	#deleted or renamed since the scandir - forget it, a file back under that name is new
+					built.pop(entry.path,None)
+					pending.pop(entry.path,None)
+					continue
+				sig=(st.st_mtime_ns,st.st_size)
+				if built.get(entry.path)==sig:
+					continue
+				if pending.get(entry.path)!=sig:	#new or still being written
+					pending[entry.path]=sig
+					continue
+				del pending[entry.path]
+				built[entry.path]=sig
+				build(entry.path)
+			time.sleep(interval)
+	except KeyboardInterrupt:
+		pass
+
+
+#Per scaffold nearest/breaktpf and per superscaffold outputlist results from the previous run in this output directory, if it was on the same tpf, code and settings
+def load_state(statefile,key):
+
+	try:
+		with open(statefile,'rb') as f:
+			state=pickle.load(f)
+		if state["key"]==key:
+			return state
+	except (OSError,EOFError,pickle.UnpicklingError,KeyError):
+		pass
+	return {"key":key,"nearest":{},"breaktpf":{},"outputlist":{}}
+
+
+def save_state(statefile,state):
+
+	with atomic_write(statefile,binary=True) as fout:
+		pickle.dump(state,fout,protocol=pickle.HIGHEST_PROTOCOL)
+
+
+#Which cache entries were recomputed rather than reused this run - reused entries are the very same objects
+def recomputed(before,after):
+
+	return sum(1 for k,v in after.items() if before.get(k) is not v)
+
+
+def main():
+
+	global fitting, adaptive
+	parser = argparse.ArgumentParser(description='Designed to take pretext generated AGP and fit your assembly TPF to it.') 
+
+	#positional args
+	parser.add_argument('tpf', metavar='tpf', type=str, help='assembly TPF with gaps as needed to allow rearrangement to match the edited PretextView map.')
+	parser.add_argument('agp', metavar='agp', type=str, nargs='?', help='Pretext agp (optional with --watch)')
+	#parser.add_argument('breaks', metavar='breaks', type=str, help='breaks file')
+	#parser.add_argument('fasta', metavar='fasta', type=str, help='original assembly fasta')
+	parser.add_argument('--fit', choices=['nearest','align'], default=fitting, help='how agp dividers are matched to tpf component ends: nearest snaps each divider to its closest end, align fits all of a scaffold\'s dividers to its ends in order, no two on one end, with the least total displacement (default: nearest)')
+	parser.add_argument('--adaptive', action='store_true', help='size each scaffold\'s divider search window from its own component lengths and the agp\'s HiC MAP RESOLUTION (at least one texel, at most netsize texels) instead of netsize texels everywhere')
+	parser.add_argument('--breaks', metavar='tsv', help='XL mode: exact break coordinates (a dividers.tsv, or scaffold and bp per line).  Skips the nearest end search, keeps every agp fragment and splits components wherever a break falls inside one')
+	parser.add_argument('--dividers', metavar='tsv', help='dividers.tsv of an earlier run (with its .sig beside it): scaffolds whose tpf lines, agp dividers and settings are unchanged take their breakpoints from it instead of being searched again')
+	parser.add_argument('-o', '--outdir', metavar='dir', default='', help='directory for the output files (default: current directory)')
+	parser.add_argument('--out-prefix', metavar='prefix', default='', help='prepended to every output file name, eg sample1. gives sample1.rapid_prtxt.tpf')
+	parser.add_argument('--watch', metavar='dir', help='keep the tpf loaded and rebuild the outputs (outdir/<agp name>.rapid_prtxt.tpf etc) whenever a *.pretext.agp in dir is added or saved')
+	parser.add_argument('--interval', metavar='s', type=float, default=0.1, help='--watch polling interval in seconds (default: 0.1)')
+	parser.add_argument('--incremental', action='store_true', help='keep per scaffold results in the output directory (rapid_prtxt.state) and on the next run with the same tpf only recompute the scaffolds and superscaffolds the agp changed')
+	parser.add_argument('--cache', metavar='dir', nargs='?', const='', help='reuse the outputs of an earlier run with identical inputs, code and settings (default dir: ~/.cache/rapid_pretext)')
+	parser.add_argument('--cache-max-mb', metavar='mb', type=float, default=2048, help='evict least recently used cache entries above this total size (default: 2048)')
+	parser.add_argument('--cache-max-days', metavar='days', type=float, default=30, help='evict cache entries unused for this long (default: 30)')
+	parser.add_argument('--trace', metavar='prefix', nargs='?', const='', help='run under cProfile, writing prefix.pstats and prefix.collapsed (flamegraph stacks) (default: rapid_prtxt_trace in the output directory)')
+	parser.add_argument('--profile', metavar='json', nargs='?', const='', help='write per stage wall/cpu time, peak RSS and item counts as json (default: rapid_prtxt_profile.json in the output directory)')
+
+	#display help when misusage
+	if len(sys.argv) <2: 
+		parser.print_help()
+
+	args = parser.parse_args()  #gets the arguments
+	if args.agp is None and not args.watch:
+		parser.error("an agp is needed unless --watch is given")
+	if args.watch and (args.cache is not None or args.incremental):
+		parser.error("--watch keeps its own caches in memory, --cache and --incremental don't apply")
+	if args.breaks and (args.watch or args.incremental):
+		parser.error("--breaks runs are always full runs, --watch and --incremental don't apply")
+	if args.dividers and (args.breaks or args.watch):
+		parser.error("--dividers can't be combined with --breaks or --watch")
+	fitting=args.fit
+	adaptive=args.adaptive
+	start_time = datetime.now()
+	if args.outdir:
+		os.makedirs(args.outdir,exist_ok=True)
+	out=lambda name: os.path.join(args.outdir,args.out_prefix+name)	#bare file names when no outdir is given, as before
+	if args.trace is not None:
+		import profstacks	#only loaded when tracing, so a normal run carries no profiler
+		prof=profstacks.start()
+		atexit.register(lambda: print("Trace written:", *profstacks.finish(prof,args.trace or out("rapid_prtxt_trace")), file=sys.stderr))
+	if args.profile is not None:
+		global profile
+		profile=[]
+		cpu_start=time.process_time()
+		atexit.register(lambda: write_profile(args.profile or out("rapid_prtxt_profile.json"),args.tpf,args.agp,(datetime.now()-start_time).total_seconds(),time.process_time()-cpu_start))	#also written if the run stops on an AGP error
+
+	outputs={"dividers.tsv":out("dividers.tsv"),"dividers.tsv.sig":sig_path(out("dividers.tsv")),"rapid_prtxt.tpf":out("rapid_prtxt.tpf"),"haps_rapid_prtxt.tpf":hap_path(out("rapid_prtxt.tpf"))}
+	if args.cache is not None:
+		import result_cache
+		cachedir=args.cache or result_cache.DEFAULT_DIR
+		#texel is derived from the tpf bytes, and file names are in the printed report
+		params={"netsize":netsize,"lowcutoff":lowcutoff,"prefix":prefix,"sex":sex,"fitting":fitting,"adaptive":adaptive,"tpf":args.tpf,"breaks":args.breaks,"dividers":args.dividers,"outputs":outputs}
+		keyfiles=[args.tpf,args.agp,os.path.abspath(__file__)]+([args.breaks] if args.breaks else [])
+		if args.dividers:	#reused breakpoints come from the dividers file and its .sig (if there is one), so their bytes are part of the key too
+			keyfiles+=[args.dividers]+([sig_path(args.dividers)] if os.path.exists(sig_path(args.dividers)) else [])
+			params["dividers_sig"]=os.path.exists(sig_path(args.dividers))
+		key=staged("cache_key",None,result_cache.cache_key,keyfiles,params)
+		entry=result_cache.lookup(cachedir,key)
+		if entry:
+			sys.stdout.write(staged("cache_restore",None,result_cache.restore,entry,outputs))
+			return
+		report=sys.stdout=result_cache.Tee(sys.stdout)
+
+	state={"nearest":None,"breaktpf":None,"outputlist":None}	#no caches unless --incremental
+	if args.incremental:
+		import result_cache
+		statefile=out("rapid_prtxt.state")
+		state=load_state(statefile,result_cache.cache_key([args.tpf,os.path.abspath(__file__)],{"netsize":netsize,"lowcutoff":lowcutoff,"prefix":prefix,"fitting":fitting,"adaptive":adaptive}))
+		previous={k:dict(v) for k,v in state.items() if k!="key"}
+
+	#print("\n")
+
+	tpfdata=load_tpf(args.tpf)
+	if args.watch:
+		watch(tpfdata,args.watch,args.agp,out,args.interval)
+		return
+
+	try:
+		breaks=staged("read_breaks",len,read_breaks,args.breaks) if args.breaks else None
+		reuse=staged("load_dividers",len,load_dividers,args.dividers) if args.dividers else None
+		run_agp(tpfdata,args.agp,outputs,state,breaks,reuse)
+	finally:	#what was worked out is kept even if the run stops on an agp error
+		if args.incremental:
+			staged("save_state",None,save_state,statefile,state)
+			print("Incremental: recomputed "+str(recomputed(previous["nearest"],state["nearest"]))+"/"+str(len(state["nearest"]))+" scaffolds in nearest, "+str(recomputed(previous["breaktpf"],state["breaktpf"]))+"/"+str(len(state["breaktpf"]))+" in breaktpf, "+str(recomputed(previous["outputlist"],state["outputlist"]))+"/"+str(len(state["outputlist"]))+" superscaffolds in outputlist",file=sys.stderr)
+
+	if args.cache is not None:
+		sys.stdout=report.stream
+		staged("cache_store",None,result_cache.store,cachedir,key,outputs,report.getvalue())
+		result_cache.evict(cachedir,args.cache_max_mb*2**20,args.cache_max_days*86400)
+
 	end_time=datetime.now()
 	#print('\n\nFINISHED:\t{}'.format(end_time - start_time)+"\n\n")
 
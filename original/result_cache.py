@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+On-disk result cache for rapid_pretext2tpf runs.
+
+An entry is keyed on the sha256 of the input file bytes, the script's own
+source and the run parameters, so any change to the TPF, the AGP, the code
+or a setting is a miss. Each entry is a directory holding the output files
+and the report the run printed. Entries are written to a temporary
+directory and renamed into place, so concurrent runs never see half an
+entry. Hits refresh an entry's mtime, so eviction (by age, then oldest
+first down to a size limit) drops the least recently used.
+"""
+
+import io
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+DEFAULT_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "rapid_pretext"
+)
+REPORT = "stdout.txt"
+BLOCK = 1 << 20
+
+
+def cache_key(files, params):
+    """Hex sha256 over the bytes of each file in files and the json of params."""
+    h = hashlib.sha256()
+    for file_name in files:
+        with open(file_name, "rb") as f:
+            while block := f.read(BLOCK):
+                h.update(block)
+        h.update(b"\0")
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def lookup(cache_dir, key):
+    """Entry directory for key, or None on a miss."""
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isdir(entry):
+        return None
+    os.utime(entry)
+    return entry
+
+
+def restore(entry, outputs):
+    """Copy a hit's files to their output paths and return the report it printed.
+
+    outputs maps the stored file name to where it should be written.
+    """
+    from zopen import atomic_write
+
+    for name, path in outputs.items():
+        with open(os.path.join(entry, name)) as f, atomic_write(path) as fout:
+            shutil.copyfileobj(f, fout)
+    with open(os.path.join(entry, REPORT)) as f:
+        return f.read()
+
+
+def store(cache_dir, key, outputs, report):
+    """Save output files (stored name -> current path) and the printed report under key."""
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, f".{key}.{uuid.uuid4().hex[:12]}.tmp")
+    os.mkdir(tmp)
+    try:
+        for name, path in outputs.items():
+            shutil.copyfile(path, os.path.join(tmp, name))
+        with open(os.path.join(tmp, REPORT), "w") as fout:
+            fout.write(report)
+        os.rename(tmp, os.path.join(cache_dir, key))
+    except OSError:  # another run stored the same key first, or the disk is full
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def evict(cache_dir, max_bytes, max_age):
+    """Remove entries unused for max_age seconds, then the oldest until under max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path) or name.startswith("."):
+            continue
+        size = sum(
+            os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+        )
+        entries.append((os.path.getmtime(path), size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    now = time.time()
+    for mtime, size, path in entries:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+class Tee(io.TextIOBase):
+    """Passes writes through to stream while keeping a copy for the cache."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.copy = io.StringIO()
+
+    def write(self, s):
+        self.copy.write(s)
+        return self.stream.write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+    def getvalue(self):
+        return self.copy.getvalue()
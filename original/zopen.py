@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""
+Shared streaming reader for curation inputs (TPF, AGP, FASTA).
+
+Open() sniffs the gzip magic and hands back a text stream, so plain, gzip and
+BGZF (bgzip) files can be read line by line without decompressing to disk.
+BGZF is a series of independent gzip blocks, so with threads > 1 the blocks
+are inflated on a thread pool (zlib releases the GIL) and yielded in order.
+
+atomic_write() is the matching writer for outputs: readers, and other runs
+writing the same name, only ever see a complete file.
+"""
+
+import io
+import os
+import gzip
+import uuid
+import zlib
+import struct
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def is_bgzf(head):
+    """True if the first 18 bytes of a file are a BGZF block header."""
+    return (
+        len(head) >= 18
+        and head[:2] == GZIP_MAGIC
+        and head[3] & 4  # FEXTRA
+        and head[12:14] == b"BC"
+    )
+
+
+def _inflate(block):
+    """Decompress one BGZF block (header, deflate data, CRC32, ISIZE)."""
+    xlen = struct.unpack("<H", block[10:12])[0]
+    crc, isize = struct.unpack("<II", block[-8:])
+    data = zlib.decompress(block[12 + xlen : -8], -15)
+    if len(data) != isize or zlib.crc32(data) != crc:
+        raise ValueError("corrupt BGZF block")
+    return data
+
+
+class BgzfReader(io.RawIOBase):
+    """Raw byte stream over a BGZF file, inflating blocks on a thread pool."""
+
+    def __init__(self, file_name, threads):
+        self._f = open(file_name, "rb")
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._pending = deque()
+        self._window = threads * 4  # blocks in flight
+        self._buf = memoryview(b"")
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _next_block(self):
+        head = self._f.read(18)
+        if not head:
+            return None
+        if not is_bgzf(head):
+            raise ValueError(f"{self._f.name} is not BGZF throughout")
+        bsize = struct.unpack("<H", head[16:18])[0] + 1
+        return head + self._f.read(bsize - 18)
+
+    def _fill(self):
+        while not self._eof and len(self._pending) < self._window:
+            block = self._next_block()
+            if block is None:
+                self._eof = True
+            else:
+                self._pending.append(self._pool.submit(_inflate, block))
+
+    def readinto(self, b):
+        while not self._buf:
+            self._fill()
+            if not self._pending:
+                return 0
+            self._buf = memoryview(self._pending.popleft().result())
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            for future in self._pending:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            self._f.close()
+        super().close()
+
+
+def Open(file_name, threads=1, binary=False):
+    """Open a plain, gzip or BGZF file for streaming reads, as text unless binary.
+
+    threads > 1 inflates BGZF blocks in parallel; plain gzip is always read
+    on a single thread since its deflate stream can't be split.
+    """
+    with open(file_name, "rb") as f:
+        head = f.read(18)
+    if head[:2] != GZIP_MAGIC:
+        return open(file_name, "rb" if binary else "r")
+    if threads > 1 and is_bgzf(head):
+        f = io.BufferedReader(BgzfReader(file_name, threads), buffer_size=1 << 20)
+        return f if binary else io.TextIOWrapper(f)
+    return gzip.open(file_name, "rb" if binary else "rt")
+
+
+@contextmanager
+def atomic_write(file_name, binary=False):
+    """Write file_name via a uniquely named temporary file beside it, renamed into place on success.
+
+    The temporary name is random rather than pid based, so runs on different
+    hosts sharing a filesystem can't collide. On an exception the partial
+    file is removed and any existing file_name is left untouched.
+    """
+    tmp = f"{file_name}.{uuid.uuid4().hex[:12]}.tmp"
+    try:
+        with open(tmp, "xb" if binary else "x") as f:
+            yield f
+        os.replace(tmp, file_name)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
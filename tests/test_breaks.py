@@ -0,0 +1,52 @@
+import os
+import sys
+import glob
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "original", "rapid_pretext2tpf.py")
+TPF = glob.glob(os.path.join(ROOT, "input-data", "*.tpf"))[0]
+AGP = glob.glob(os.path.join(ROOT, "input-data", "*.agp"))[0]
+
+
+def run(cwd, *args):
+    return subprocess.run(
+        [sys.executable, SCRIPT, TPF, AGP, *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_empty_breaks_file(tmp_path):
+    breaks = tmp_path / "breaks.tsv"
+    breaks.write_text("#scaffold\tAGP\tTPF\n")
+    r = run(tmp_path, "--breaks", str(breaks))
+    assert r.returncode == 0, r.stderr
+    assert (tmp_path / "rapid_prtxt.tpf").exists()
+    assert (tmp_path / "dividers.tsv").read_text() == "#scaffold\tAGP\tTPF\n"
+
+
+def agp_ends(agp):
+    """{scaffold: set of bp each agp piece of it ends at (or starts after)}"""
+    ends = {}
+    with open(agp) as f:
+        for line in f:
+            x = line.split()
+            if line.startswith("#") or len(x) < 9 or x[4] == "U":
+                continue
+            ends.setdefault(x[5], set()).update((int(x[6]) - 1, int(x[7])))
+    return ends
+
+
+def test_breaks_from_own_dividers(tmp_path):
+    dividers = os.path.join(ROOT, "known_output", "dividers.tsv")
+    r = run(tmp_path, "--breaks", dividers)
+    assert r.returncode == 0, r.stderr
+    splits = [line.split() for line in r.stdout.splitlines() if line.startswith("Splitting ")]
+    assert splits
+    ends = agp_ends(AGP)
+    for _, comp, _, bp in splits:
+        assert int(bp) in ends[comp.split(":")[0]], comp + " split at " + bp
+    haps = (tmp_path / "haps_rapid_prtxt.tpf").read_text().split()
+    assert "scaffold_3:36676041-37488994" in haps